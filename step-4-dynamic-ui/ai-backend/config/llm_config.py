@@ -3,7 +3,9 @@ LLM Configuration for Step 2 - RAG Integration
 Extended from Step 1 with additional configurations
 """
 import os
+import time
 from typing import Dict, Any, Optional
+import httpx
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_community.llms import Ollama
@@ -18,6 +20,12 @@ class LLMConfig:
     def __init__(self):
         self.provider = os.getenv("LLM_PROVIDER", "ollama").lower()
         self.setup_provider_configs()
+        # One connection pool shared by every OpenRouter LLM this config creates
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        # Last ping result and when it expires, so frequent health probes don't hit the provider
+        self._ping_ttl = float(os.getenv("LLM_PING_TTL", "15"))
+        self._ping_cache: Optional[Dict[str, Any]] = None
+        self._ping_expires = 0.0
     
     def setup_provider_configs(self):
         """Setup configurations for different LLM providers"""
@@ -80,9 +88,22 @@ class LLMConfig:
             openai_api_base=config["base_url"],
             model_name=config["model"],
             temperature=temperature or config["temperature"],
-            max_tokens=max_tokens or config["max_tokens"]
+            max_tokens=max_tokens or config["max_tokens"],
+            http_async_client=self._get_http_async_client()
         )
     
+    def _get_http_async_client(self) -> httpx.AsyncClient:
+        """Shared pooled HTTP client, created on first use"""
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=10.0))
+        return self._http_async_client
+    
+    async def aclose(self):
+        """Close the shared HTTP client, if one was created"""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+    
     def get_info(self) -> Dict[str, Any]:
         """Get current LLM configuration info"""
         config = self.configs.get(self.provider, {})
@@ -95,6 +116,30 @@ class LLMConfig:
             "base_url": config.get("base_url", "unknown")
         }
     
+    async def ping(self, timeout: float = 2.0) -> Dict[str, Any]:
+        """Lightweight reachability probe for the configured LLM provider, cached for LLM_PING_TTL seconds"""
+        now = time.monotonic()
+        if self._ping_cache is not None and now < self._ping_expires:
+            return self._ping_cache
+        
+        config = self.configs.get(self.provider, {})
+        base_url = config.get("base_url", "").rstrip("/")
+        
+        if self.provider == "ollama":
+            url, headers = f"{base_url}/api/tags", {}
+        else:
+            url, headers = f"{base_url}/models", {"Authorization": f"Bearer {config.get('api_key')}"}
+        
+        response = await self._get_http_async_client().get(url, headers=headers, timeout=timeout)
+        
+        self._ping_cache = {
+            "status": "healthy" if response.status_code == 200 else "unhealthy",
+            "provider": self.provider,
+            "model": config.get("model", "unknown")
+        }
+        self._ping_expires = now + self._ping_ttl
+        return self._ping_cache
+    
     def validate_config(self) -> bool:
         """Validate current configuration"""
         if self.provider not in self.configs:
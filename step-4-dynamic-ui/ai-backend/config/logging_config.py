@@ -49,6 +49,10 @@ class LoggingConfig:
                 compression="gz"
             )
     
+    def is_enabled_for(self, level: str) -> bool:
+        """Whether records at the given level reach the configured handlers"""
+        return logger.level(level.upper()).no >= logger.level(self.log_level).no
+    
     def get_logger(self, name: str = None):
         """Get logger instance with optional name"""
         if name:
@@ -3,13 +3,18 @@ Step 4: Dynamic UI Generation Server
 Enhanced FastAPI server with RAG capabilities and Dynamic UI Generation
 """
 import os
+import gzip
 import time
-import uuid
+import asyncio
+import functools
 import logging
 from datetime import datetime
-from typing import Dict, Any
-from fastapi import FastAPI, HTTPException
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
@@ -24,6 +29,7 @@ from config.logging_config import logging_config
 from rag_service import RAGService
 from shared.observability.langfuse_client import langfuse_client
 from shared.observability.langfuse_decorator import observe
+from shared.observability.hybrid_tracing import start_span_buffer, drain_span_buffer, submit_spans
 
 # Load environment variables
 load_dotenv()
@@ -36,6 +42,14 @@ llm_config = LLMConfig()
 agent = EnhancedAgent(os.getenv("TRADITIONAL_API_URL", "http://localhost:4000"))
 rag_service = RAGService()
 
+# Pre-bound references for the /chat hot path
+_lf_create_trace = langfuse_client.create_trace
+_lf_log_end = langfuse_client.log_conversation_end
+_lf_flush = functools.partial(langfuse_client.flush, force=True)
+_process_query = agent.process_query_with_orchestration
+_now = datetime.now
+_log_info = logger.info
+
 # FastAPI app
 app = FastAPI(
     title="AI Mode Backend - Step 4 (Dynamic UI Generation)",
@@ -52,6 +66,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Second-granularity ISO timestamp for probes and read-only GET endpoints,
+# refreshed by a background task instead of formatted on every request
+_NOW_ISO = datetime.now().isoformat()
+
+async def _refresh_now_iso():
+    """Keep _NOW_ISO current while the server is running"""
+    global _NOW_ISO
+    while True:
+        _NOW_ISO = datetime.now().isoformat()
+        await asyncio.sleep(0.5)
+
+# Spans buffered by finished /chat and /chat/stream requests, submitted by the periodic flusher
+_pending_spans: List[Dict[str, Any]] = []
+
+def _submit_and_flush(spans: List[Dict[str, Any]]):
+    """Submit buffered spans and flush LangFuse"""
+    submit_spans(spans)
+    _lf_flush()
+
+async def _periodic_flush(interval: float = 1.0):
+    """Flush LangFuse once per interval instead of once per request"""
+    global _pending_spans
+    while True:
+        await asyncio.sleep(interval)
+        spans, _pending_spans = _pending_spans, []
+        try:
+            await asyncio.to_thread(_submit_and_flush, spans)
+        except Exception as e:
+            # A failed flush drops this interval's spans, never the flusher itself
+            logger.warning("Periodic LangFuse flush failed ({} spans dropped): {}", len(spans), e)
+
 # Request models
 class ChatRequest(BaseModel):
     message: str
@@ -62,6 +107,15 @@ class KnowledgeSearchRequest(BaseModel):
     type: str = "auto"  # auto, faq, business_rules
     limit: int = 5
 
+class BatchSubRequest(BaseModel):
+    id: str
+    url: str
+    method: str = "GET"
+    body: Optional[Dict[str, Any]] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -85,16 +139,31 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Enhanced health check endpoint"""
-    # Check RAG service health
-    rag_health = await rag_service.health_check()
+    # Run sub-probes concurrently so total latency is the slowest probe, not the sum
+    rag_health, llm_health, mcp_health = [
+        {"status": "unhealthy", "error": str(probe)} if isinstance(probe, Exception) else probe
+        for probe in await asyncio.gather(
+            rag_service.health_check(),
+            llm_config.ping(),
+            agent.mcp_tools.ping(),
+            return_exceptions=True
+        )
+    ]
+    
+    # Overall status reflects the sub-probes rather than just "the server answered"
+    probes_healthy = all(
+        probe.get("status") == "healthy" for probe in (rag_health, llm_health, mcp_health)
+    )
     
     return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
+        "status": "healthy" if probes_healthy else "degraded",
+        "timestamp": _NOW_ISO,
         "llm_provider": llm_config.provider,
         "version": "4.0.0",
         "services": {
             "rag_service": rag_health,
+            "llm": llm_health,
+            "mcp_tools": mcp_health,
             "ui_generation": "enabled"
         }
     }
@@ -105,34 +174,37 @@ async def chat_endpoint(request: ChatRequest):
     session_id = request.context.get("session_id", f"session_{int(time.time())}")
     
     # Create LangFuse trace for the conversation
-    trace_id = langfuse_client.create_trace(
+    trace_id = _lf_create_trace(
         user_message=request.message,
         session_id=session_id,
         metadata=request.context
-    ) or str(uuid.uuid4())
+    ) or os.urandom(16).hex()
+    span_buffer = start_span_buffer()
+    request_start_ns = time.perf_counter_ns()
+    failed = False
     
     try:
-        logger.info(f"Enhanced chat request: {request.message}")
+        _log_info("Enhanced chat request: {}", request.message)
         
         # Process query with enhanced agent - try orchestration first, then intelligent processing
-        response_data = await agent.process_query_with_orchestration(request.message, request.context, trace_id)
+        response_data = await _process_query(request.message, request.context, trace_id)
         
         # Check if orchestration succeeded
         if response_data.get("response_type") == "orchestrated_response":
             # Orchestration succeeded, use the response directly
-            logger.info(f"✅ Using orchestration response")
+            _log_info("✅ Using orchestration response")
             # Add required fields for LangFuse compatibility
             execution_plan = response_data.get("orchestration", {})
             tool_results = []  # Tool results are embedded in orchestration response
         elif response_data.get("response_type") in ["intelligent_with_ui", "context_required"]:
             # Intelligent processing succeeded, use the response directly
-            logger.info(f"✅ Using intelligent response: {response_data.get('response_type')}")
+            _log_info("✅ Using intelligent response: {}", response_data.get("response_type"))
             # Add required fields for LangFuse compatibility
             execution_plan = response_data.get("intent", {})
             tool_results = response_data.get("tool_results", [])
         else:
             # Intelligent processing fell back, try the old system as backup
-            logger.info("🔄 Intelligent processing fell back, using traditional processing")
+            _log_info("🔄 Intelligent processing fell back, using traditional processing")
             execution_plan = response_data  # The fallback returns traditional format
             
             # Execute transactional tools if needed
@@ -153,53 +225,64 @@ async def chat_endpoint(request: ChatRequest):
                 request.context
             )
         
+        # Bind response fields once; reused by the LangFuse log and the response body
+        message = response_data.get("message", "")
+        response_type = response_data.get("response_type", "text_only")
+        ui_components = response_data.get("ui_components", [])
+        knowledge_results_count = len(execution_plan.get("knowledge_results", []))
+        is_orchestrated = response_type == "orchestrated_response"
+        orchestration = response_data.get("orchestration", {}) if is_orchestrated else None
+        if is_orchestrated:
+            tools_used = orchestration.get("tools_used", [])
+        else:
+            tools_used = [tc["tool"] for tc in execution_plan.get("tool_calls", [])]
+        
         # Update LangFuse trace with final output
-        langfuse_client.log_conversation_end(
+        _lf_log_end(
             trace_id=trace_id,
-            response=response_data.get("message", ""),
-            response_type=response_data.get("response_type", "text_only"),
+            response=message,
+            response_type=response_type,
             total_execution_time=0,
             components_summary={
                 "strategy": execution_plan.get("strategy"),
-                "knowledge_results_count": len(execution_plan.get("knowledge_results", [])),
+                "knowledge_results_count": knowledge_results_count,
                 "tool_results_count": len(tool_results),
-                "ui_components_count": len(response_data.get("ui_components", [])),
-                "total_components": len(response_data.get("ui_components", []))
+                "ui_components_count": len(ui_components),
+                "total_components": len(ui_components),
+                "tools_used": tools_used
             },
             metadata={
                 "success": True,
-                "response_type": response_data.get("response_type", "text_only")
+                "response_type": response_type
             }
         )
         
-        # Flush LangFuse data
-        langfuse_client.flush()
-        
         return {
-            "message": response_data.get("message", ""),
-            "ui_components": response_data.get("ui_components", []),
+            "message": message,
+            "ui_components": ui_components,
             "layout_strategy": response_data.get("layout_strategy", "text_only"),
             "user_intent": response_data.get("user_intent", "unknown"),
-            "response_type": response_data.get("response_type", "text_only"),
-            "timestamp": datetime.now().isoformat(),
+            "response_type": response_type,
+            "timestamp": _now().isoformat(),
             "session_id": session_id,
             "trace_id": trace_id,
             "strategy": execution_plan.get("strategy"),
             "debug": {
-                "tools_used": [tc["tool"] for tc in execution_plan.get("tool_calls", [])] if "tool_calls" in execution_plan else response_data.get("orchestration", {}).get("tools_used", []),
-                "knowledge_results": len(execution_plan.get("knowledge_results", [])),
+                "tools_used": tools_used,
+                "knowledge_results": knowledge_results_count,
                 "llm_provider": llm_config.provider,
                 "query_type": execution_plan.get("query_type"),
                 "ui_generation_enabled": True,
                 "validation": response_data.get("validation", {}),
-                "processing_type": "orchestration" if response_data.get("response_type") == "orchestrated_response" else "traditional",
-                "orchestration": response_data.get("orchestration", {}) if response_data.get("response_type") == "orchestrated_response" else None
+                "processing_type": "orchestration" if is_orchestrated else "traditional",
+                "orchestration": orchestration if is_orchestrated else None
             }
         }
         
     except Exception as e:
+        failed = True
         logger.error(f"Enhanced chat processing failed: {e}")
-        langfuse_client.log_conversation_end(
+        _lf_log_end(
             trace_id=trace_id,
             response=f"Error: {str(e)}",
             response_type="error",
@@ -208,13 +291,78 @@ async def chat_endpoint(request: ChatRequest):
             metadata={"success": False, "error": str(e)}
         )
         raise HTTPException(status_code=500, detail=str(e))
+    
+    finally:
+        elapsed_ms = (time.perf_counter_ns() - request_start_ns) / 1e6
+        _pending_spans.extend(drain_span_buffer(span_buffer, elapsed_ms, failed))
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Chat endpoint streaming newline-delimited JSON events as the response is generated"""
+    session_id = request.context.get("session_id", f"session_{int(time.time())}")
+    trace_id = _lf_create_trace(
+        user_message=request.message,
+        session_id=session_id,
+        metadata=request.context
+    ) or os.urandom(16).hex()
+    
+    async def events():
+        # Started inside the generator so spans are collected in the context that runs the query
+        span_buffer = start_span_buffer()
+        request_start_ns = time.perf_counter_ns()
+        message_parts = []
+        response_type = "error"
+        components_summary = {}
+        try:
+            response_data = await _process_query(request.message, request.context, trace_id)
+            
+            if response_data.get("response_type") in ("orchestrated_response", "intelligent_with_ui", "context_required"):
+                # Orchestrated and intelligent responses are complete already
+                response_type = response_data.get("response_type")
+                message_parts.append(response_data.get("message", ""))
+                yield orjson.dumps({"type": "final", **response_data, "session_id": session_id, "trace_id": trace_id}, default=str) + b"\n"
+                return
+            
+            tool_results = []
+            if response_data.get("tool_calls"):
+                tool_results = await agent.execute_tools(response_data["tool_calls"], session_id, trace_id)
+            components_summary["strategy"] = response_data.get("strategy")
+            components_summary["tool_results_count"] = len(tool_results)
+            
+            async for event in agent.format_response_stream(
+                response_data, tool_results, request.message, trace_id, request.context
+            ):
+                if event["type"] == "text":
+                    message_parts.append(event["content"])
+                else:
+                    response_type = event.get("response_type", response_type)
+                    components_summary["ui_components_count"] = len(event.get("ui_components", []))
+                    event = {**event, "session_id": session_id, "trace_id": trace_id,
+                             "strategy": response_data.get("strategy")}
+                yield orjson.dumps(event, default=str) + b"\n"
+        except Exception as e:
+            logger.error(f"Enhanced chat streaming failed: {e}")
+            yield orjson.dumps({"type": "error", "message": str(e), "response_type": "error"}) + b"\n"
+        finally:
+            _lf_log_end(
+                trace_id=trace_id,
+                response="".join(message_parts),
+                response_type=response_type,
+                total_execution_time=0,
+                components_summary=components_summary,
+                metadata={"success": response_type != "error", "response_type": response_type, "streamed": True}
+            )
+            elapsed_ms = (time.perf_counter_ns() - request_start_ns) / 1e6
+            _pending_spans.extend(drain_span_buffer(span_buffer, elapsed_ms, response_type == "error"))
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @app.post("/knowledge/search")
 @observe(as_type="span")
 async def knowledge_search_endpoint(request: KnowledgeSearchRequest):
     """Direct knowledge base search endpoint"""
     try:
-        logger.info(f"Knowledge search request: {request.query} (type: {request.type})")
+        logger.info("Knowledge search request: {} (type: {})", request.query, request.type)
         
         if request.type == "faq":
             results = await rag_service.search_faq(request.query, request.limit)
@@ -254,146 +402,150 @@ async def get_knowledge_suggestions(query: str, limit: int = 3):
             "query": query,
             "suggestions": suggestions,
             "count": len(suggestions),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _NOW_ISO
         }
         
     except Exception as e:
         logger.error(f"Knowledge suggestions failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/tools")
-async def get_available_tools():
-    """Get available tools including RAG capabilities"""
-    return {
-        "transactional_tools": [
-            {
-                "name": "search_products",
-                "description": "Search for products by name, description, or brand",
-                "parameters": {
-                    "query": "string",
-                    "filters": "object (optional)"
-                }
-            },
-            {
-                "name": "get_products", 
-                "description": "Get all products with optional filters",
-                "parameters": {
-                    "category_id": "int (optional)", 
-                    "brand": "string (optional)",
-                    "limit": "int (optional)",
-                    "offset": "int (optional)"
-                }
-            },
-            {
-                "name": "get_customers",
-                "description": "Get all customers with search and pagination",
-                "parameters": {
-                    "limit": "int (optional)",
-                    "search": "string (optional)"
-                }
-            },
-            {
-                "name": "get_customer_orders",
-                "description": "Get orders for a specific customer",
-                "parameters": {
-                    "customer_id": "string",
-                    "limit": "int (optional)"
-                }
-            },
-            {
-                "name": "create_order",
-                "description": "Create a new order",
-                "parameters": {
-                    "customer_id": "string",
-                    "product_id": "string",
-                    "quantity": "int (optional)",
-                    "shipping_address": "string (optional)",
-                    "payment_method": "string (optional)",
-                    "special_instructions": "string (optional)"
-                }
-            },
-            {
-                "name": "get_categories",
-                "description": "Get all product categories",
-                "parameters": {}
+# Static tool catalogue, serialized once at import time
+_TOOLS_DICT = {
+    "transactional_tools": [
+        {
+            "name": "search_products",
+            "description": "Search for products by name, description, or brand",
+            "parameters": {
+                "query": "string",
+                "filters": "object (optional)"
             }
-        ],
-        "knowledge_tools": [
-            {
-                "name": "faq_search",
-                "description": "Search FAQ knowledge base",
-                "parameters": {
-                    "query": "string",
-                    "limit": "int (optional)"
-                }
-            },
-            {
-                "name": "business_rules_search",
-                "description": "Search business rules knowledge base",
-                "parameters": {
-                    "query": "string",
-                    "limit": "int (optional)"
-                }
-            },
-            {
-                "name": "hybrid_search",
-                "description": "Search both FAQ and business rules",
-                "parameters": {
-                    "query": "string",
-                    "limit": "int (optional)"
-                }
+        },
+        {
+            "name": "get_products", 
+            "description": "Get all products with optional filters",
+            "parameters": {
+                "category_id": "int (optional)", 
+                "brand": "string (optional)",
+                "limit": "int (optional)",
+                "offset": "int (optional)"
             }
-        ],
-        "ui_tools": [
-            {
-                "name": "get_component_library",
-                "description": "Get complete UI component library with all available components",
-                "parameters": {}
-            },
-            {
-                "name": "get_component_schema",
-                "description": "Get detailed schema for specific component",
-                "parameters": {
-                    "component_name": "string"
-                }
-            },
-            {
-                "name": "get_ui_patterns",
-                "description": "Get recommended UI patterns for specific intent",
-                "parameters": {
-                    "intent": "string"
-                }
-            },
-            {
-                "name": "validate_component_spec",
-                "description": "Validate component specification against schema",
-                "parameters": {
-                    "component_spec": "object"
-                }
-            },
-            {
-                "name": "get_cache_status",
-                "description": "Get component cache status and statistics",
-                "parameters": {}
-            },
-            {
-                "name": "refresh_component_cache",
-                "description": "Force refresh component cache",
-                "parameters": {}
+        },
+        {
+            "name": "get_customers",
+            "description": "Get all customers with search and pagination",
+            "parameters": {
+                "limit": "int (optional)",
+                "search": "string (optional)"
             }
-        ],
-        "query_types": [
-            "transactional",
-            "faq",
-            "business_rule",
-            "mixed"
-        ],
-        "response_types": [
-            "text_only",
-            "enhanced_with_ui",
-            "error"
-        ]
-    }
+        },
+        {
+            "name": "get_customer_orders",
+            "description": "Get orders for a specific customer",
+            "parameters": {
+                "customer_id": "string",
+                "limit": "int (optional)"
+            }
+        },
+        {
+            "name": "create_order",
+            "description": "Create a new order",
+            "parameters": {
+                "customer_id": "string",
+                "product_id": "string",
+                "quantity": "int (optional)",
+                "shipping_address": "string (optional)",
+                "payment_method": "string (optional)",
+                "special_instructions": "string (optional)"
+            }
+        },
+        {
+            "name": "get_categories",
+            "description": "Get all product categories",
+            "parameters": {}
+        }
+    ],
+    "knowledge_tools": [
+        {
+            "name": "faq_search",
+            "description": "Search FAQ knowledge base",
+            "parameters": {
+                "query": "string",
+                "limit": "int (optional)"
+            }
+        },
+        {
+            "name": "business_rules_search",
+            "description": "Search business rules knowledge base",
+            "parameters": {
+                "query": "string",
+                "limit": "int (optional)"
+            }
+        },
+        {
+            "name": "hybrid_search",
+            "description": "Search both FAQ and business rules",
+            "parameters": {
+                "query": "string",
+                "limit": "int (optional)"
+            }
+        }
+    ],
+    "ui_tools": [
+        {
+            "name": "get_component_library",
+            "description": "Get complete UI component library with all available components",
+            "parameters": {}
+        },
+        {
+            "name": "get_component_schema",
+            "description": "Get detailed schema for specific component",
+            "parameters": {
+                "component_name": "string"
+            }
+        },
+        {
+            "name": "get_ui_patterns",
+            "description": "Get recommended UI patterns for specific intent",
+            "parameters": {
+                "intent": "string"
+            }
+        },
+        {
+            "name": "validate_component_spec",
+            "description": "Validate component specification against schema",
+            "parameters": {
+                "component_spec": "object"
+            }
+        },
+        {
+            "name": "get_cache_status",
+            "description": "Get component cache status and statistics",
+            "parameters": {}
+        },
+        {
+            "name": "refresh_component_cache",
+            "description": "Force refresh component cache",
+            "parameters": {}
+        }
+    ],
+    "query_types": [
+        "transactional",
+        "faq",
+        "business_rule",
+        "mixed"
+    ],
+    "response_types": [
+        "text_only",
+        "enhanced_with_ui",
+        "error"
+    ]
+}
+_TOOLS_BYTES = orjson.dumps(_TOOLS_DICT)
+
+@app.get("/tools")
+async def get_available_tools():
+    """Get available tools including RAG capabilities"""
+    return Response(content=_TOOLS_BYTES, media_type="application/json")
 
 @app.get("/knowledge/stats")
 async def get_knowledge_stats():
@@ -406,7 +558,7 @@ async def get_knowledge_stats():
             "collections": health_info.get("collections", {}),
             "stats": health_info.get("stats", {}),
             "embedding_model": health_info.get("embedding_model"),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _NOW_ISO
         }
         
     except Exception as e:
@@ -417,27 +569,102 @@ async def get_knowledge_stats():
 # UI Generation Endpoints
 # ========================================
 
+# (etag, body, timestamp the gzip was built at, gzip-compressed JSON body) of the
+# last served component library, keyed on the MCP component directory hash
+_COMPONENT_LIB_CACHE: Optional[Tuple[str, Dict[str, Any], Optional[str], Optional[bytes]]] = None
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (gzip;q=0 refuses it)"""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists etag (or is *)"""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
+
+async def _component_library_body() -> Tuple[Dict[str, Any], Optional[str]]:
+    """Fetch the component library and build the response body and its version"""
+    result = await agent.mcp_tools.get_component_library()
+    
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=result.get("error", "Component library fetch failed"))
+    
+    body = {
+        "success": True,
+        "components": result["data"],
+        "source": result.get("source", "unknown"),
+        "component_count": len(result["data"]),
+        "metadata": result.get("metadata", {}),
+        "timestamp": _NOW_ISO
+    }
+    return body, result.get("version")
+
+def _gzip_component_library(etag: str, body: Dict[str, Any]) -> bytes:
+    """Gzip the library body, re-stamping and recompressing at most once per clock tick"""
+    global _COMPONENT_LIB_CACHE
+    cached = _COMPONENT_LIB_CACHE
+    if cached is not None and cached[0] == etag and cached[2] == _NOW_ISO:
+        return cached[3]
+    
+    body = {**body, "timestamp": _NOW_ISO}
+    compressed = gzip.compress(orjson.dumps(body, default=str), compresslevel=1)
+    _COMPONENT_LIB_CACHE = (etag, body, _NOW_ISO, compressed)
+    return compressed
+
 @app.get("/ui/components")
 @observe(as_type="span")
-async def get_component_library():
+async def get_component_library(request: Request):
     """Get complete UI component library"""
+    global _COMPONENT_LIB_CACHE
     try:
         logger.info("Component library request")
         
-        # Access MCP tools through the agent
-        result = await agent.mcp_tools.get_component_library()
+        # Conditional requests are answered from the directory hash alone, before any
+        # content negotiation or library fetch. Hashing globs and stats every component
+        # file, so it runs off the event loop
+        etag = f'"{await asyncio.to_thread(agent.mcp_tools.get_component_library_version)}"'
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
         
-        if result.get("success"):
-            return {
-                "success": True,
-                "components": result["data"],
-                "source": result.get("source", "unknown"),
-                "component_count": len(result["data"]),
-                "metadata": result.get("metadata", {}),
-                "timestamp": datetime.now().isoformat()
-            }
+        cached = _COMPONENT_LIB_CACHE
+        if cached is not None and cached[0] == etag:
+            body = cached[1]
         else:
-            raise HTTPException(status_code=500, detail=result.get("error", "Component library fetch failed"))
+            body, version = await _component_library_body()
+            if version is None:
+                return body
+            etag = f'"{version}"'
+            _COMPONENT_LIB_CACHE = (etag, body, None, None)
+        
+        if not _accepts_gzip(request.headers.get("accept-encoding", "")):
+            return Response(
+                content=orjson.dumps({**body, "timestamp": _NOW_ISO}, default=str),
+                media_type="application/json",
+                headers={"ETag": etag, "Vary": "Accept-Encoding"}
+            )
+        
+        return Response(
+            content=_gzip_component_library(etag, body),
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip", "ETag": etag, "Vary": "Accept-Encoding"}
+        )
             
     except Exception as e:
         logger.error(f"Component library fetch failed: {e}")
@@ -448,7 +675,7 @@ async def get_component_library():
 async def get_component_schema(component_name: str):
     """Get detailed schema for specific component"""
     try:
-        logger.info(f"Component schema request: {component_name}")
+        logger.info("Component schema request: {}", component_name)
         
         result = await agent.mcp_tools.get_component_schema(component_name)
         
@@ -457,7 +684,7 @@ async def get_component_schema(component_name: str):
                 "success": True,
                 "component": result["data"],
                 "source": result.get("source", "unknown"),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _NOW_ISO
             }
         else:
             raise HTTPException(status_code=404, detail=result.get("error", f"Component '{component_name}' not found"))
@@ -470,7 +697,7 @@ async def get_component_schema(component_name: str):
 async def get_ui_patterns(intent: str):
     """Get recommended UI patterns for specific intent"""
     try:
-        logger.info(f"UI patterns request: {intent}")
+        logger.info("UI patterns request: {}", intent)
         
         result = await agent.mcp_tools.get_ui_patterns(intent)
         
@@ -480,7 +707,7 @@ async def get_ui_patterns(intent: str):
                 "intent": intent,
                 "patterns": result["data"]["patterns"],
                 "recommendations": result["data"]["recommendations"],
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _NOW_ISO
             }
         else:
             raise HTTPException(status_code=500, detail=result.get("error", "UI patterns fetch failed"))
@@ -501,7 +728,7 @@ async def get_component_cache_status():
             return {
                 "success": True,
                 "cache_info": result["data"],
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _NOW_ISO
             }
         else:
             raise HTTPException(status_code=500, detail=result.get("error", "Cache status fetch failed"))
@@ -539,7 +766,7 @@ class UIValidationRequest(BaseModel):
 async def validate_component_spec(request: UIValidationRequest):
     """Validate component specification against schema"""
     try:
-        logger.info(f"Component validation request: {request.component_spec.get('type', 'unknown')}")
+        logger.info("Component validation request: {}", request.component_spec.get('type', 'unknown'))
         
         result = await agent.mcp_tools.validate_component_spec(request.component_spec)
         
@@ -561,10 +788,83 @@ async def validate_component_spec(request: UIValidationRequest):
         logger.error(f"Component validation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ========================================
+# Batch Endpoint
+# ========================================
+
+async def _dispatch_batch_subrequest(sub: BatchSubRequest) -> Dict[str, Any]:
+    """Route a single batched sub-request to its endpoint handler"""
+    parsed = urlsplit(sub.url)
+    path = parsed.path.rstrip("/") or "/"
+    params = dict(parse_qsl(parsed.query))
+    method = sub.method.upper()
+    
+    try:
+        if method == "GET" and path == "/ui/components":
+            body, _ = await _component_library_body()
+        elif method == "GET" and path.startswith("/ui/components/"):
+            body = await get_component_schema(path[len("/ui/components/"):])
+        elif method == "GET" and path == "/ui/patterns":
+            body = await get_ui_patterns(params["intent"])
+        elif method == "GET" and path == "/ui/cache/status":
+            body = await get_component_cache_status()
+        elif method == "GET" and path == "/knowledge/stats":
+            body = await get_knowledge_stats()
+        elif method == "GET" and path == "/knowledge/suggestions":
+            body = await get_knowledge_suggestions(params["query"], int(params.get("limit", 3)))
+        elif method == "POST" and path == "/knowledge/search":
+            body = await knowledge_search_endpoint(KnowledgeSearchRequest(**(sub.body or {})))
+        elif method == "GET" and path == "/tools":
+            body = _TOOLS_DICT
+        else:
+            return {"id": sub.id, "status": 404, "body": {"detail": f"Unsupported batch route: {method} {path}"}}
+        
+        return {"id": sub.id, "status": 200, "body": body}
+        
+    except HTTPException as e:
+        return {"id": sub.id, "status": e.status_code, "body": {"detail": e.detail}}
+    except (KeyError, ValueError) as e:
+        return {"id": sub.id, "status": 422, "body": {"detail": f"Invalid sub-request parameters: {e}"}}
+    except Exception as e:
+        logger.error("Batch sub-request {} failed: {}", sub.id, e)
+        return {"id": sub.id, "status": 500, "body": {"detail": str(e)}}
+
+@app.post("/batch")
+async def batch_endpoint(request: BatchRequest):
+    """Execute independent UI/knowledge sub-requests in parallel within one round-trip"""
+    logger.info("Batch request: {} sub-requests", len(request.requests))
+    
+    # A sub-request that still escapes its handler fails only its own entry
+    results = await asyncio.gather(
+        *(_dispatch_batch_subrequest(sub) for sub in request.requests),
+        return_exceptions=True
+    )
+    responses = [
+        {"id": sub.id, "status": 500, "body": {"detail": str(result)}}
+        if isinstance(result, BaseException) else result
+        for sub, result in zip(request.requests, results)
+    ]
+    
+    return {
+        "responses": responses,
+        "count": len(responses),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background tasks"""
+    app.state.clock_task = asyncio.create_task(_refresh_now_iso())
+    app.state.flush_task = asyncio.create_task(_periodic_flush())
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    app.state.clock_task.cancel()
+    app.state.flush_task.cancel()
+    _submit_and_flush(_pending_spans)
     await agent.close()
+    await llm_config.aclose()
 
 if __name__ == "__main__":
     import uvicorn
@@ -574,9 +874,9 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", "8001"))
     
     logger.info("🚀 Starting AI Mode Backend - Step 4 (Dynamic UI Generation)")
-    logger.info(f"   Port: {port}")
-    logger.info(f"   LLM Provider: {llm_config.provider}")
-    logger.info(f"   LLM Info: {llm_config.get_info()}")
+    logger.info("   Port: {}", port)
+    logger.info("   LLM Provider: {}", llm_config.provider)
+    logger.info("   LLM Info: {}", llm_config.get_info())
     logger.info("   Features: Enhanced AI agent with RAG capabilities and Dynamic UI Generation")
     
     # Check LangFuse connection before starting (STRICTLY REQUIRED)
@@ -600,9 +900,15 @@ if __name__ == "__main__":
     else:
         logger.info("✅ LangFuse connection confirmed on port 3001")
     
+    # uvloop + httptools for event-loop and HTTP parsing throughput. Multiple
+    # workers need an import string; sessions are in-process, so default to one.
+    workers = int(os.getenv("WORKERS", "1"))
     uvicorn.run(
-        app,
+        "server:app" if workers > 1 else app,
         host="0.0.0.0",
         port=port,
-        log_level="info"
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
+        workers=workers
     )
\ No newline at end of file
@@ -2,10 +2,14 @@
 Hybrid LangFuse tracing that combines manual trace creation with automatic spans
 """
 
+import os
 import functools
+import inspect
+import itertools
+import reprlib
 import time
-import uuid
-from typing import Any, Dict, Optional, Callable
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Callable
 from loguru import logger
 
 try:
@@ -15,6 +19,61 @@ except ImportError:
     LANGFUSE_AVAILABLE = False
 
 from .langfuse_client import langfuse_client
+from .langfuse_decorator import head_sampled
+
+# Spans recorded by @langfuse_trace during the current request. When a buffer
+# is active, spans are collected here and submitted together by the caller
+# instead of being sent to the SDK one by one.
+_span_buffer: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("langfuse_span_buffer", default=None)
+
+# Tail sampling: with LANGFUSE_TAIL_SAMPLING=1 a request's buffered spans are only
+# kept if the request failed, a span recorded an error, or it ran past the threshold
+_TAIL_SAMPLING = os.getenv('LANGFUSE_TAIL_SAMPLING', '0') == '1'
+_TAIL_LATENCY_MS = float(os.getenv('LANGFUSE_TAIL_LATENCY_MS', '2000'))
+
+
+def start_span_buffer() -> Token:
+    """Start collecting spans for the current context"""
+    return _span_buffer.set([])
+
+
+def drain_span_buffer(token: Token, elapsed_ms: Optional[float] = None, failed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Stop collecting spans and return the ones recorded since start_span_buffer.
+    Under tail sampling, fast successful requests return no spans.
+    """
+    spans = _span_buffer.get() or []
+    _span_buffer.reset(token)
+    if _TAIL_SAMPLING and not _is_interesting(spans, elapsed_ms, failed):
+        return []
+    return spans
+
+
+def _is_interesting(spans: List[Dict[str, Any]], elapsed_ms: Optional[float], failed: bool) -> bool:
+    """Tail-sampling rule: keep failed or slow requests"""
+    if failed or (elapsed_ms is not None and elapsed_ms >= _TAIL_LATENCY_MS):
+        return True
+    return any(span.get("metadata", {}).get("error") for span in spans)
+
+
+def submit_spans(spans: List[Dict[str, Any]]):
+    """Send buffered spans to LangFuse"""
+    for span_kwargs in spans:
+        try:
+            langfuse_client.client.span(**span_kwargs)
+        except Exception as e:
+            logger.warning(f"Failed to submit span {span_kwargs.get('name')}: {e}")
+
+
+def _record_span(**span_kwargs):
+    """Buffer a span if a request buffer is active, otherwise send it directly"""
+    # Every span gets its id here, from os.urandom rather than the SDK's uuid4
+    span_kwargs["id"] = os.urandom(16).hex()
+    buffer = _span_buffer.get()
+    if buffer is not None:
+        buffer.append(span_kwargs)
+    else:
+        langfuse_client.client.span(**span_kwargs)
 
 
 def langfuse_trace(name: str = None):
@@ -25,89 +84,94 @@ def langfuse_trace(name: str = None):
     def decorator(func: Callable) -> Callable:
         if not LANGFUSE_AVAILABLE:
             return func
+        
+        span_name = name or f"{func.__module__}.{func.__name__}"
             
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # Get trace_id from kwargs if available
-            trace_id = kwargs.get('trace_id')
-            
-            span_name = name or f"{func.__module__}.{func.__name__}"
-            start_time = time.time()
-            
-            try:
-                # Execute the function
-                result = await func(*args, **kwargs)
-                execution_time = time.time() - start_time
+        # Build only the wrapper matching func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # Get trace_id from kwargs if available
+                trace_id = kwargs.get('trace_id')
                 
-                # Log the operation if we have a trace_id
-                if trace_id and hasattr(langfuse_client, 'client') and langfuse_client.client:
-                    try:
-                        # Create span using LangFuse SDK v2 API
-                        span = langfuse_client.client.span(
-                            trace_id=trace_id,
-                            name=span_name,
-                            input=_safe_serialize_args(args, kwargs),
-                            output=_safe_serialize_result(result),
-                            metadata={
-                                "function": func.__name__,
-                                "module": func.__module__,
-                                "execution_time_ms": execution_time * 1000
-                            },
-                            start_time=start_time,
-                            end_time=time.time()
-                        )
-                        
-                        # The span object is returned and managed by LangFuse
-                        logger.debug(f"Created span {span_name} in trace {trace_id}")
-                        
-                    except Exception as e:
-                        logger.warning(f"Failed to log span for {span_name}: {e}")
-                
-                return result
-                
-            except Exception as e:
-                execution_time = time.time() - start_time
-                
-                # Log the error if we have a trace_id
-                if trace_id and hasattr(langfuse_client, 'client') and langfuse_client.client:
-                    try:
-                        span = langfuse_client.client.span(
-                            trace_id=trace_id,
-                            name=span_name,
-                            input=_safe_serialize_args(args, kwargs),
-                            output={"error": str(e)},
-                            metadata={
-                                "function": func.__name__,
-                                "module": func.__module__,
-                                "execution_time_ms": execution_time * 1000,
-                                "error": True
-                            },
-                            start_time=start_time,
-                            end_time=time.time()
-                        )
-                        
-                        logger.debug(f"Created error span {span_name} in trace {trace_id}")
-                        
-                    except Exception as log_error:
-                        logger.warning(f"Failed to log error span for {span_name}: {log_error}")
+                start_time = time.time()
+                start_ns = time.perf_counter_ns()
                 
-                raise
+                try:
+                    # Execute the function
+                    result = await func(*args, **kwargs)
+                    execution_time_ms = (time.perf_counter_ns() - start_ns) / 1e6
+                    
+                    # Log the operation if we have a trace_id
+                    if trace_id and langfuse_client.enabled:
+                        try:
+                            # Create span using LangFuse SDK v2 API
+                            _record_span(
+                                trace_id=trace_id,
+                                name=span_name,
+                                input=_safe_serialize_args(args, kwargs),
+                                output=_safe_serialize_result(result),
+                                metadata={
+                                    "function": func.__name__,
+                                    "module": func.__module__,
+                                    "execution_time_ms": execution_time_ms
+                                },
+                                start_time=start_time,
+                                end_time=start_time + execution_time_ms / 1000
+                            )
+                            
+                            logger.debug(f"Created span {span_name} in trace {trace_id}")
+                            
+                        except Exception as e:
+                            logger.warning(f"Failed to log span for {span_name}: {e}")
+                    
+                    return result
+                    
+                except Exception as e:
+                    execution_time_ms = (time.perf_counter_ns() - start_ns) / 1e6
+                    
+                    # Log the error if we have a trace_id
+                    if trace_id and langfuse_client.enabled:
+                        try:
+                            _record_span(
+                                trace_id=trace_id,
+                                name=span_name,
+                                input=_safe_serialize_args(args, kwargs),
+                                output={"error": str(e)},
+                                metadata={
+                                    "function": func.__name__,
+                                    "module": func.__module__,
+                                    "execution_time_ms": execution_time_ms,
+                                    "error": True
+                                },
+                                start_time=start_time,
+                                end_time=start_time + execution_time_ms / 1000
+                            )
+                            
+                            logger.debug(f"Created error span {span_name} in trace {trace_id}")
+                            
+                        except Exception as log_error:
+                            logger.warning(f"Failed to log error span for {span_name}: {log_error}")
+                    
+                    raise
+            
+            return head_sampled(func, async_wrapper)
         
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
             # For synchronous functions
             trace_id = kwargs.get('trace_id')
             
-            span_name = name or f"{func.__module__}.{func.__name__}"
             start_time = time.time()
+            start_ns = time.perf_counter_ns()
             
             try:
                 result = func(*args, **kwargs)
-                execution_time = time.time() - start_time
+                execution_time_ms = (time.perf_counter_ns() - start_ns) / 1e6
                 
-                if trace_id and hasattr(langfuse_client, 'client') and langfuse_client.client:
+                if trace_id and langfuse_client.enabled:
                     try:
-                        span = langfuse_client.client.span(
+                        _record_span(
                             trace_id=trace_id,
                             name=span_name,
                             input=_safe_serialize_args(args, kwargs),
@@ -115,10 +179,10 @@ def langfuse_trace(name: str = None):
                             metadata={
                                 "function": func.__name__,
                                 "module": func.__module__,
-                                "execution_time_ms": execution_time * 1000
+                                "execution_time_ms": execution_time_ms
                             },
                             start_time=start_time,
-                            end_time=time.time()
+                            end_time=start_time + execution_time_ms / 1000
                         )
                         
                         logger.debug(f"Created sync span {span_name} in trace {trace_id}")
@@ -129,22 +193,21 @@ def langfuse_trace(name: str = None):
                 return result
                 
             except Exception as e:
-                execution_time = time.time() - start_time
+                execution_time_ms = (time.perf_counter_ns() - start_ns) / 1e6
                 
-                if trace_id and hasattr(langfuse_client, 'client') and langfuse_client.client:
+                if trace_id and langfuse_client.enabled:
                     try:
-                        langfuse_client.client.span(
-                            id=str(uuid.uuid4()),
+                        _record_span(
                             trace_id=trace_id,
                             name=span_name,
                             start_time=start_time,
-                            end_time=time.time(),
+                            end_time=start_time + execution_time_ms / 1000,
                             input=_safe_serialize_args(args, kwargs),
                             output={"error": str(e)},
                             metadata={
                                 "function": func.__name__,
                                 "module": func.__module__,
-                                "execution_time_ms": execution_time * 1000,
+                                "execution_time_ms": execution_time_ms,
                                 "error": True
                             }
                         )
@@ -153,27 +216,47 @@ def langfuse_trace(name: str = None):
                 
                 raise
         
-        # Return appropriate wrapper based on function type
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return head_sampled(func, sync_wrapper)
     
     return decorator
 
 
+# Bounded repr: caps work on large values (e.g. tool_results lists) instead of
+# stringifying the whole object and slicing afterwards
+_arg_repr = reprlib.Repr()
+_arg_repr.maxstring = 200
+_arg_repr.maxother = 200
+_arg_repr.maxlist = 5
+_arg_repr.maxtuple = 5
+_arg_repr.maxdict = 5
+_arg_repr.maxset = 5
+
+_MAX_SERIALIZED_KEYS = 20
+
+
+def _truncate(value, limit: int = 200) -> str:
+    """Render a value for logging without materializing its full string form"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return value[:limit]
+    return _arg_repr.repr(value)[:limit]
+
+
 def _safe_serialize_args(args, kwargs) -> Dict[str, Any]:
     """Safely serialize function arguments for logging"""
     try:
-        # Remove 'self' and 'cls' from args, and trace_id from kwargs
-        safe_kwargs = {k: v for k, v in kwargs.items() if k != 'trace_id'}
-        
         # For methods, skip the first argument (self)
         safe_args = args[1:] if args and hasattr(args[0], '__dict__') else args
         
+        # Remove trace_id from kwargs and cap the number of serialized keys
+        safe_kwargs = itertools.islice(
+            ((k, v) for k, v in kwargs.items() if k != 'trace_id'), _MAX_SERIALIZED_KEYS
+        )
+        
         return {
-            "args": str(safe_args)[:500],  # Limit length
-            "kwargs": {k: str(v)[:200] for k, v in safe_kwargs.items()}  # Limit length
+            "args": _truncate(safe_args, 500),  # Limit length
+            "kwargs": {k: _truncate(v) for k, v in safe_kwargs}  # Limit length
         }
     except Exception:
         return {"serialization_error": "Could not serialize arguments"}
@@ -183,12 +266,8 @@ def _safe_serialize_result(result) -> Any:
     """Safely serialize function result for logging"""
     try:
         if isinstance(result, dict):
-            return {k: str(v)[:200] for k, v in result.items()}
+            return {k: _truncate(v) for k, v in itertools.islice(result.items(), _MAX_SERIALIZED_KEYS)}
         else:
-            return str(result)[:500]
+            return _truncate(result, 500)
     except Exception:
         return {"serialization_error": "Could not serialize result"}
-
-
-# Import asyncio at the end to avoid circular imports
-import asyncio
\ No newline at end of file
@@ -4,8 +4,17 @@ Tracks agent decisions, RAG operations, tool usage, and UI generation patterns.
 """
 
 import os
+import sys
 import json
+import gzip
+import base64
+import httpx
+import orjson
 import uuid
+import time
+import atexit
+import threading
+from collections import deque
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from loguru import logger
@@ -17,6 +26,131 @@ except ImportError:
     LANGFUSE_AVAILABLE = False
     logger.warning("LangFuse not installed. Install with: pip install langfuse")
 
+try:
+    import zstandard
+    _ZSTD = zstandard.ZstdCompressor(level=3)
+except ImportError:
+    _ZSTD = None
+
+_uuid4 = uuid.uuid4
+
+
+def _new_id() -> str:
+    """128-bit random hex id for traces and spans, without building a UUID object."""
+    return os.urandom(16).hex()
+
+
+class _GzipTransport(httpx.HTTPTransport):
+    """HTTP transport that gzip-compresses request bodies of at least min_bytes."""
+    
+    def __init__(self, min_bytes: int, **kwargs):
+        super().__init__(**kwargs)
+        self.min_bytes = min_bytes
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        if len(body) >= self.min_bytes and "Content-Encoding" not in request.headers:
+            headers = request.headers.copy()
+            headers.pop("Content-Length", None)
+            headers["Content-Encoding"] = "gzip"
+            request = httpx.Request(
+                request.method,
+                request.url,
+                headers=headers,
+                content=gzip.compress(body, compresslevel=1),
+                extensions=request.extensions
+            )
+        return super().handle_request(request)
+
+
+# Shared connection pool for SDK ingestion requests. Batches are JSON; with
+# LANGFUSE_GZIP_REQUESTS=1 large ones are gzipped (the server must accept it)
+_INGEST_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10)
+if os.getenv('LANGFUSE_GZIP_REQUESTS', '0') == '1':
+    _INGEST_TRANSPORT = _GzipTransport(min_bytes=int(os.getenv('LANGFUSE_GZIP_MIN_BYTES', '1024')),
+                                       limits=_INGEST_LIMITS)
+else:
+    _INGEST_TRANSPORT = httpx.HTTPTransport(limits=_INGEST_LIMITS)
+_INGEST_CLIENT = httpx.Client(transport=_INGEST_TRANSPORT)
+
+# Per-field caps keep individual observations well under the backend's row size limit
+_MAX_FIELD_BYTES = int(os.getenv('LANGFUSE_MAX_FIELD_BYTES', '4096'))
+_MAX_LIST_ITEMS = int(os.getenv('LANGFUSE_MAX_LIST_ITEMS', '10'))
+_MAX_DEPTH = 5
+_TRUNCATED_FIELDS = ("input", "output", "metadata")
+
+# Optional zstd packing of large input/output fields (needs: pip install zstandard)
+_COMPRESS_FIELDS = _ZSTD is not None and os.getenv('LANGFUSE_COMPRESS_FIELDS', '0') == '1'
+_COMPRESSED_FIELDS = ("input", "output")
+_MAX_COMPRESSED_BYTES = int(os.getenv('LANGFUSE_MAX_COMPRESSED_BYTES', '65536'))
+_ZSTD_PREFIX = "_zstd:"
+
+# Structured input/output is normalized with orjson in the drainer (numpy values,
+# non-str keys, arbitrary objects via str) so the SDK only sees plain JSON types.
+# It stays a dict/list, so LangFuse still stores structured input and output
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+_NORMALIZED_FIELDS = ("input", "output")
+
+# Span times are captured as time.time_ns() ints and turned into datetimes in the drainer
+_TIME_FIELDS = ("start_time", "end_time")
+
+
+def _dumps(value: Any) -> str:
+    return orjson.dumps(value, default=str, option=_ORJSON_OPTIONS).decode()
+
+
+def _normalize(value: Any) -> Any:
+    """Round-trip a structured value through orjson, leaving only JSON-native types"""
+    return orjson.loads(orjson.dumps(value, default=str, option=_ORJSON_OPTIONS))
+
+
+def _compress(value: Any) -> Any:
+    """Pack a large field as '_zstd:' + base64(zstd(json)); leave it unchanged if small or still too big."""
+    text = value if isinstance(value, str) else _dumps(value)
+    if len(text) <= _MAX_FIELD_BYTES:
+        return value
+    packed = _ZSTD_PREFIX + base64.b64encode(_ZSTD.compress(text.encode())).decode()
+    return packed if len(packed) <= _MAX_COMPRESSED_BYTES else value
+
+
+def _truncate(obj: Any, max_str: int = _MAX_FIELD_BYTES, max_list: int = _MAX_LIST_ITEMS,
+              max_depth: int = _MAX_DEPTH) -> Any:
+    """Recursively cap string lengths, list lengths and nesting depth of a payload."""
+    if isinstance(obj, str):
+        if len(obj) > max_str:
+            return f"{obj[:max_str]}... [truncated {len(obj) - max_str} chars]"
+        return obj
+    if isinstance(obj, dict):
+        if max_depth <= 0:
+            return "[truncated: max depth]"
+        return {k: _truncate(v, max_str, max_list, max_depth - 1) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        if max_depth <= 0:
+            return "[truncated: max depth]"
+        items = [_truncate(v, max_str, max_list, max_depth - 1) for v in obj[:max_list]]
+        if len(obj) > max_list:
+            items.append(f"... [truncated {len(obj) - max_list} items]")
+        return items
+    return obj
+
+
+# Constant metadata shared by every observation of a kind, merged with dict union
+_BASE_TRACE_META = {"step": "4_dynamic_ui", "feature": "enhanced_agent_rag_ui"}
+_BASE_AGENT_META = {"component": "enhanced_agent", "operation": "query_classification"}
+_BASE_RAG_META = {"component": "rag_service", "operation": "semantic_search", "vector_db": "qdrant"}
+_BASE_TOOL_META = {"component": "mcp_tools"}
+_BASE_LLM_META = {"component": "llm"}
+_BASE_UI_META = {
+    "component": "ui_generator",
+    "operation": "dynamic_component_generation",
+    "feature": "step4_dynamic_ui"
+}
+
+
+def _noop(*args, **kwargs):
+    """Stand-in for logging methods when LangFuse is disabled."""
+    return None
+
 
 class LangFuseClient:
     """
@@ -27,12 +161,36 @@ class LangFuseClient:
     def __init__(self):
         self.enabled = False
         self.client = None
-        self.session_id = str(uuid.uuid4())
+        self.session_id = _uuid4().hex
+        
+        # Observations are buffered in one deque and sent by a background thread, so
+        # request handlers only pay for a deque append (atomic, no lock). The asyncio
+        # server produces from a single thread, so sharding would buy nothing
+        self._capacity = int(os.getenv('LANGFUSE_QUEUE_SIZE', '20000'))
+        self._buffer = deque()
+        self._dropped = 0
+        # Guards _dropped, which the producer increments and the drainer swaps out
+        self._dropped_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._send_lock = threading.Lock()
+        
+        # Batch thresholds shared by the drainer and the SDK's own consumer
+        self.flush_at = int(os.getenv('LANGFUSE_FLUSH_AT', '50'))
+        self.flush_interval = float(os.getenv('LANGFUSE_FLUSH_INTERVAL', '2.0'))
         
         if LANGFUSE_AVAILABLE:
             self._initialize_client()
         else:
             logger.info("LangFuse client disabled - package not available")
+        
+        if self.enabled:
+            threading.Thread(target=self._drain, name="langfuse-drainer", daemon=True).start()
+            atexit.register(self._final_flush)
+        else:
+            # Skip argument and metadata construction entirely when disabled
+            self.create_trace = self.log_agent_decision = self.log_rag_operation = _noop
+            self.log_tool_execution = self.log_llm_generation = self.log_ui_generation = _noop
+            self.log_conversation_end = self.flush = _noop
     
     def _initialize_client(self):
         """Initialize LangFuse client with environment variables."""
@@ -48,7 +206,10 @@ class LangFuseClient:
             self.client = Langfuse(
                 host=host,
                 public_key=public_key,
-                secret_key=secret_key
+                secret_key=secret_key,
+                flush_at=self.flush_at,
+                flush_interval=self.flush_interval,
+                httpx_client=_INGEST_CLIENT
             )
             
             # Test connection
@@ -60,6 +221,73 @@ class LangFuseClient:
             logger.warning(f"Failed to initialize LangFuse client: {e}")
             self.enabled = False
     
+    def _enqueue(self, kind: str, **kwargs):
+        """Buffer a client call ('trace', 'span', 'generation') for the drainer thread; drop it if the buffer is full."""
+        if _COMPRESS_FIELDS:
+            for field in _COMPRESSED_FIELDS:
+                if kwargs.get(field) is not None:
+                    kwargs[field] = _compress(kwargs[field])
+        for field in _TRUNCATED_FIELDS:
+            value = kwargs.get(field)
+            if value is not None and not (isinstance(value, str) and value.startswith(_ZSTD_PREFIX)):
+                kwargs[field] = _truncate(value)
+        buf = self._buffer
+        if len(buf) >= self._capacity:
+            with self._dropped_lock:
+                self._dropped += 1
+            return
+        buf.append((kind, kwargs))
+        if len(buf) >= self.flush_at and not self._wakeup.is_set():
+            self._wakeup.set()
+    
+    def _drain(self):
+        """Send buffered observations every flush_interval seconds, or sooner once flush_at are pending."""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._send_pending()
+    
+    def _send_pending(self):
+        """Harvest the buffer and send its observations in batches of up to flush_at items."""
+        with self._send_lock:
+            batch = []
+            buf = self._buffer
+            while buf:
+                batch.append(buf.popleft())
+                if len(batch) >= self.flush_at:
+                    self._send_batch(batch)
+                    batch = []
+            if batch:
+                self._send_batch(batch)
+            
+            # Report overflow as one event per harvest rather than per dropped item
+            with self._dropped_lock:
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                logger.warning(f"LangFuse buffer full; dropped {dropped} observations")
+                try:
+                    self.client.event(name="langfuse_backpressure_dropped", metadata={"count": dropped})
+                except Exception as e:
+                    logger.error(f"Failed to send LangFuse backpressure event: {e}")
+    
+    def _send_batch(self, batch):
+        for kind, kwargs in batch:
+            try:
+                for field in _NORMALIZED_FIELDS:
+                    if isinstance(kwargs.get(field), (dict, list)):
+                        kwargs[field] = _normalize(kwargs[field])
+                for field in _TIME_FIELDS:
+                    if isinstance(kwargs.get(field), int):
+                        kwargs[field] = datetime.fromtimestamp(kwargs[field] / 1e9)
+                getattr(self.client, kind)(**kwargs)
+            except Exception as e:
+                logger.error(f"Failed to send LangFuse {kind}: {e}")
+        
+        try:
+            self.client.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush LangFuse client: {e}")
+    
     def create_trace(self, 
                     user_message: str, 
                     session_id: Optional[str] = None,
@@ -70,22 +298,20 @@ class LangFuseClient:
             return None
         
         try:
-            trace_id = str(uuid.uuid4())
+            trace_id = _new_id()
             
             # Use the correct API for creating traces (SDK v2)
-            trace = self.client.trace(
+            self._enqueue(
+                "trace",
+                id=trace_id,
                 name="step4_dynamic_ui_conversation",
                 input=user_message,
-                metadata={
-                    "step": "4_dynamic_ui",
-                    "feature": "enhanced_agent_rag_ui", 
+                metadata=_BASE_TRACE_META | {
                     "user_id": user_id or "anonymous",
                     "session_id": session_id or self.session_id,
-                    "timestamp": datetime.now().isoformat(),
-                    **(metadata or {})
-                }
+                    "timestamp_us": time.time_ns() // 1000
+                } | (metadata or {})
             )
-            trace_id = trace.id if hasattr(trace, 'id') else str(uuid.uuid4())
             
             return trace_id
             
@@ -104,12 +330,14 @@ class LangFuseClient:
             return
         
         try:
-            self.client.span(
-                id=str(uuid.uuid4()),
+            now = time.time_ns()
+            self._enqueue(
+                "span",
+                id=_new_id(),
                 trace_id=trace_id,
                 name="agent_query_classification",
-                start_time=datetime.now(),
-                end_time=datetime.now(),
+                start_time=now,
+                end_time=now,
                 input={
                     "query_type": query_type,
                     "confidence": confidence,
@@ -119,11 +347,7 @@ class LangFuseClient:
                     "decision": query_type,
                     "confidence_score": confidence
                 },
-                metadata={
-                    "component": "enhanced_agent",
-                    "operation": "query_classification",
-                    **(metadata or {})
-                }
+                metadata=_BASE_AGENT_META | (metadata or {})
             )
             
         except Exception as e:
@@ -142,12 +366,14 @@ class LangFuseClient:
             return
         
         try:
-            self.client.span(
-                id=str(uuid.uuid4()),
+            now = time.time_ns()
+            self._enqueue(
+                "span",
+                id=_new_id(),
                 trace_id=trace_id,
                 name="rag_semantic_search",
-                start_time=datetime.now(),
-                end_time=datetime.now(),
+                start_time=now,
+                end_time=now,
                 input={
                     "query": query,
                     "collection": collection_type,
@@ -158,12 +384,7 @@ class LangFuseClient:
                     "top_results": top_results[:3],  # Limit to top 3 for readability
                     "execution_time_ms": execution_time * 1000
                 },
-                metadata={
-                    "component": "rag_service",
-                    "operation": "semantic_search",
-                    "vector_db": "qdrant",
-                    **(metadata or {})
-                }
+                metadata=_BASE_RAG_META | (metadata or {})
             )
             
         except Exception as e:
@@ -183,21 +404,21 @@ class LangFuseClient:
             return
         
         try:
-            self.client.span(
-                id=str(uuid.uuid4()),
+            now = time.time_ns()
+            self._enqueue(
+                "span",
+                id=_new_id(),
                 trace_id=trace_id,
                 name=f"tool_{tool_name}",
-                start_time=datetime.now(),
-                end_time=datetime.now(),
+                start_time=now,
+                end_time=now,
                 input=input_data,
                 output=output_data if success else {"error": error_message},
-                metadata={
-                    "component": "mcp_tools",
+                metadata=_BASE_TOOL_META | {
                     "tool": tool_name,
                     "success": success,
-                    "execution_time_ms": execution_time * 1000,
-                    **(metadata or {})
-                }
+                    "execution_time_ms": execution_time * 1000
+                } | (metadata or {})
             )
             
         except Exception as e:
@@ -216,20 +437,21 @@ class LangFuseClient:
             return
         
         try:
-            self.client.generation(
-                id=str(uuid.uuid4()),
+            provider, sep, _ = model.partition(':')
+            provider = sys.intern(provider) if sep else "unknown"
+            self._enqueue(
+                "generation",
+                id=_new_id(),
                 trace_id=trace_id,
                 name="llm_generation",
                 model=model,
                 input=prompt,
                 output=response,
                 usage=tokens_used,
-                metadata={
-                    "component": "llm",
-                    "provider": model.split(':')[0] if ':' in model else "unknown",
-                    "execution_time_ms": execution_time * 1000,
-                    **(metadata or {})
-                }
+                metadata=_BASE_LLM_META | {
+                    "provider": provider,
+                    "execution_time_ms": execution_time * 1000
+                } | (metadata or {})
             )
             
         except Exception as e:
@@ -248,12 +470,14 @@ class LangFuseClient:
             return
         
         try:
-            self.client.span(
-                id=str(uuid.uuid4()),
+            now = time.time_ns()
+            self._enqueue(
+                "span",
+                id=_new_id(),
                 trace_id=trace_id,
                 name="dynamic_ui_generation",
-                start_time=datetime.now(),
-                end_time=datetime.now(),
+                start_time=now,
+                end_time=now,
                 input={
                     "user_intent": user_intent,
                     "layout_strategy": layout_strategy
@@ -265,12 +489,7 @@ class LangFuseClient:
                     "success": generation_success,
                     "validation": validation_results
                 },
-                metadata={
-                    "component": "ui_generator",
-                    "operation": "dynamic_component_generation",
-                    "feature": "step4_dynamic_ui",
-                    **(metadata or {})
-                }
+                metadata=_BASE_UI_META | (metadata or {})
             )
             
         except Exception as e:
@@ -283,13 +502,14 @@ class LangFuseClient:
                            total_execution_time: float,
                            components_summary: Dict[str, Any],
                            metadata: Dict[str, Any] = None):
-        """Log final conversation response."""
+        """Log final conversation response. Sent by the drainer thread; no flush() needed."""
         if not self.enabled or not trace_id:
             return
         
         try:
             # Update the trace with the final output
-            self.client.trace(
+            self._enqueue(
+                "trace",
                 id=trace_id,
                 update=True,
                 output=response,
@@ -298,18 +518,31 @@ class LangFuseClient:
                     "total_execution_time_ms": total_execution_time * 1000,
                     "ui_components_included": components_summary.get('total_components', 0),
                     "tools_used": components_summary.get('tools_used', []),
-                    "knowledge_results": components_summary.get('knowledge_results', 0),
-                    **(metadata or {})
-                }
+                    "knowledge_results": components_summary.get('knowledge_results', 0)
+                } | (metadata or {})
             )
             
         except Exception as e:
             logger.error(f"Failed to log conversation end: {e}")
     
-    def flush(self):
-        """Flush any pending observations to LangFuse."""
+    def flush(self, force: bool = False):
+        """
+        Flush pending observations to LangFuse.
+        
+        The drainer thread already flushes after every batch, so this is a no-op
+        unless force is set or LANGFUSE_ENFORCE_FLUSH=1 (useful for short-lived scripts).
+        Long-running servers rely on the drainer, their own periodic forced flush
+        and the exit-time flush.
+        """
+        if force or os.getenv('LANGFUSE_ENFORCE_FLUSH', '0') == '1':
+            self._final_flush()
+    
+    def _final_flush(self):
+        """Send everything queued so far and flush the SDK."""
         if self.enabled and self.client:
             try:
+                # Waits for any batch the drainer has in flight, then sends the rest
+                self._send_pending()
                 self.client.flush()
             except Exception as e:
                 logger.error(f"Failed to flush LangFuse client: {e}")
@@ -4,11 +4,20 @@ Uses @observe() decorator for clean, distributed tracing integration.
 """
 
 import os
+import sys
+import time
+import atexit
+import queue
+import random
+import threading
+import inspect
 import uuid
 import functools
-from datetime import datetime
+from contextvars import ContextVar
+import httpx
 from typing import Dict, Any, Optional, Callable, Union
 from loguru import logger
+from dotenv import dotenv_values
 
 try:
     from langfuse import observe, Langfuse
@@ -24,6 +33,53 @@ except ImportError:
             return func
         return decorator
 
+try:
+    # SDK v2 keeps the @observe client behind langfuse_context
+    from langfuse.decorators import langfuse_context
+except ImportError:
+    langfuse_context = None
+
+try:
+    # SDK v3 exposes the current span/trace through the global client
+    from langfuse import get_client as _get_langfuse_client
+except ImportError:
+    _get_langfuse_client = None
+
+
+_uuid4 = uuid.uuid4
+
+
+def _new_id() -> str:
+    """128-bit random hex id for traces, without building a UUID object"""
+    return os.urandom(16).hex()
+
+# Observation types accepted by @observe(as_type=...)
+_VALID_AS_TYPES = frozenset(sys.intern(t) for t in ("span", "trace", "generation", "event"))
+
+# Metadata stamped by the enclosing tracers; inner calls inherit it across awaits
+_META: ContextVar[Dict[str, Any]] = ContextVar("langfuse_metadata", default={})
+
+# Head sampling: fraction of requests traced; None until the outermost traced call decides
+_SAMPLE_RATE = float(os.getenv('LANGFUSE_SAMPLE_RATE', '1.0'))
+_SAMPLED: ContextVar[Optional[bool]] = ContextVar("langfuse_sampled", default=None)
+
+_ENV_FILE = os.path.join(os.path.dirname(__file__), '../../.env.langfuse')
+
+
+@functools.lru_cache(maxsize=1)
+def _load_env_file() -> Dict[str, Optional[str]]:
+    """Parse .env.langfuse once per process; a missing file yields an empty dict"""
+    try:
+        with open(_ENV_FILE, 'r') as f:
+            return dotenv_values(stream=f)
+    except FileNotFoundError:
+        return {}
+
+
+# Pooled client and result TTL for the LangFuse health check
+_HEALTH_CLIENT = httpx.Client(timeout=2.0, limits=httpx.Limits(max_connections=4, max_keepalive_connections=2))
+_HEALTH_TTL = 30.0
+
 
 class LangFuseConfig:
     """Configuration for LangFuse observability"""
@@ -31,23 +87,30 @@ class LangFuseConfig:
     def __init__(self):
         self.enabled = False
         self.client = None
-        self.session_id = str(uuid.uuid4())
+        self.session_id = _uuid4().hex
+        self._health = (float('-inf'), False)
+        self.flush_interval = float(os.getenv('LANGFUSE_FLUSH_INTERVAL', '2.0'))
+        
+        # flush() only posts a request here; a daemon thread does the blocking flush
+        self._flush_queue = queue.Queue(maxsize=1)
         
         if LANGFUSE_AVAILABLE:
             self._initialize_client()
+        
+        if self.enabled:
+            threading.Thread(target=self._flush_worker, name="langfuse-flusher", daemon=True).start()
+            # The flusher is a daemon thread and dies with the interpreter, so drain once more at exit
+            atexit.register(self._final_flush)
     
     def _initialize_client(self):
         """Initialize LangFuse client with environment variables"""
         try:
-            # Load environment variables from .env.langfuse file
-            env_file = os.path.join(os.path.dirname(__file__), '../../.env.langfuse')
-            if os.path.exists(env_file):
-                with open(env_file, 'r') as f:
-                    for line in f:
-                        if line.strip() and not line.startswith('#'):
-                            if '=' in line:
-                                key, value = line.strip().split('=', 1)
-                                os.environ[key] = value
+            # Load environment variables from .env.langfuse file (real env vars take precedence).
+            # Skip the file entirely when credentials are already in the environment.
+            if not os.getenv('LANGFUSE_PUBLIC_KEY'):
+                for key, value in _load_env_file().items():
+                    if value is not None:
+                        os.environ.setdefault(key, value)
             
             # Use the updated API keys and port
             host = os.getenv('LANGFUSE_HOST', 'http://localhost:3001')
@@ -63,6 +126,10 @@ class LangFuseConfig:
             os.environ['LANGFUSE_PUBLIC_KEY'] = public_key  
             os.environ['LANGFUSE_SECRET_KEY'] = secret_key
             
+            # Batch thresholds for the SDK's consumer, shared with LangFuseClient
+            os.environ.setdefault('LANGFUSE_FLUSH_AT', '50')
+            os.environ.setdefault('LANGFUSE_FLUSH_INTERVAL', str(self.flush_interval))
+            
             # Remove any OpenTelemetry configuration that might conflict with SDK v2
             for key in ['OTEL_EXPORTER_OTLP_TRACES_ENDPOINT', 'OTEL_EXPORTER_OTLP_HEADERS']:
                 if key in os.environ:
@@ -79,7 +146,7 @@ class LangFuseConfig:
     
     def get_trace_id(self) -> str:
         """Generate a new trace ID"""
-        return str(uuid.uuid4())
+        return _new_id()
     
     def create_trace(self, trace_id: str = None, user_id: str = "anonymous", session_id: str = None):
         """Create a trace in LangFuse (SDK v2)"""
@@ -103,161 +170,248 @@ class LangFuseConfig:
             return None
     
     def is_langfuse_available(self) -> bool:
-        """Check if LangFuse service is available and healthy"""
+        """Check if LangFuse service is available and healthy (cached for _HEALTH_TTL seconds)"""
+        checked_at, healthy = self._health
+        now = time.monotonic()
+        if now - checked_at < _HEALTH_TTL:
+            return healthy
+        
         try:
-            import requests
             host = os.getenv('LANGFUSE_HOST', 'http://localhost:3001')
-            response = requests.get(f"{host}/api/public/health", timeout=5)
-            return response.status_code == 200
+            response = _HEALTH_CLIENT.get(f"{host}/api/public/health")
+            healthy = response.status_code == 200
         except Exception as e:
             logger.warning(f"LangFuse health check failed: {e}")
-            return False
+            healthy = False
+        
+        self._health = (now, healthy)
+        return healthy
     
     def flush(self):
-        """Flush any pending observations"""
-        if self.enabled and self.client:
+        """
+        Request a flush of pending observations without blocking the caller.
+        With LANGFUSE_ENFORCE_FLUSH=1 the flush runs synchronously instead.
+        """
+        if not self.enabled:
+            return
+        
+        if os.getenv('LANGFUSE_ENFORCE_FLUSH', '0') == '1':
+            self._flush_now()
+            return
+        
+        try:
+            self._flush_queue.put_nowait(None)
+        except queue.Full:
+            pass  # A flush is already pending
+    
+    def _flush_worker(self):
+        """Flush on request, and at least every flush_interval seconds"""
+        while True:
             try:
+                self._flush_queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                pass
+            self._flush_now()
+    
+    def _final_flush(self):
+        """Drop any flush request still queued for the worker and flush synchronously."""
+        try:
+            self._flush_queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._flush_now()
+    
+    def _flush_now(self):
+        try:
+            if langfuse_context is not None:
+                langfuse_context.flush()
+            elif self.client:
                 self.client.flush()
-            except Exception as e:
-                logger.error(f"Failed to flush LangFuse client: {e}")
+        except Exception as e:
+            logger.error(f"Failed to flush LangFuse client: {e}")
 
 
 # Global configuration instance
 langfuse_config = LangFuseConfig()
 
 
-def trace_conversation(name: str = "ai_conversation", user_id: str = "anonymous", session_id: Optional[str] = None):
+def _publish_meta(meta: Dict[str, Any], as_type: str) -> None:
+    """Attach metadata to the observation (or, for traces, the trace) @observe has open"""
+    try:
+        if langfuse_context is not None:
+            if as_type == "trace":
+                langfuse_context.update_current_trace(metadata=meta)
+            else:
+                langfuse_context.update_current_observation(metadata=meta)
+        elif _get_langfuse_client is not None:
+            client = _get_langfuse_client()
+            if as_type == "trace":
+                client.update_current_trace(metadata=meta)
+            elif as_type == "generation":
+                client.update_current_generation(metadata=meta)
+            else:
+                client.update_current_span(metadata=meta)
+    except Exception as e:
+        logger.debug(f"Failed to attach LangFuse metadata: {e}")
+
+
+def _with_meta(func: Callable, get_meta: Callable[[], Dict[str, Any]], as_type: str, is_async: bool) -> Callable:
     """
-    Decorator to trace entire AI conversations
-    Usage: @trace_conversation(name="step4_dynamic_ui", user_id="user123")
+    Wrap func so get_meta() is layered onto the metadata context while it runs.
+    Runs inside @observe, so the merged metadata is also attached to the open observation.
     """
-    def decorator(func):
-        if not LANGFUSE_AVAILABLE or not langfuse_config.enabled:
-            return func
-        
-        @observe(name=name, as_type="trace")
+    if is_async:
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
-            # Extract user message and context
-            if args:
-                user_message = args[0] if isinstance(args[0], str) else str(args[0])
-            else:
-                user_message = kwargs.get('message', kwargs.get('query', 'Unknown query'))
-            
-            # Add metadata
-            kwargs['_langfuse_metadata'] = {
-                "step": "4_dynamic_ui",
-                "feature": "enhanced_agent",
-                "user_id": user_id,
-                "session_id": session_id or langfuse_config.session_id,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            return await func(*args, **kwargs)
+            meta = _META.get() | get_meta()
+            token = _META.set(meta)
+            _publish_meta(meta, as_type)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _META.reset(token)
         
-        @observe(name=name, as_type="trace")
-        @functools.wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            # Extract user message and context
-            if args:
-                user_message = args[0] if isinstance(args[0], str) else str(args[0])
-            else:
-                user_message = kwargs.get('message', kwargs.get('query', 'Unknown query'))
-            
-            # Add metadata
-            kwargs['_langfuse_metadata'] = {
-                "step": "4_dynamic_ui",
-                "feature": "enhanced_agent",
-                "user_id": user_id,
-                "session_id": session_id or langfuse_config.session_id,
-                "timestamp": datetime.now().isoformat()
-            }
-            
+        return async_wrapper
+    
+    @functools.wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        meta = _META.get() | get_meta()
+        token = _META.set(meta)
+        _publish_meta(meta, as_type)
+        try:
             return func(*args, **kwargs)
-        
-        return async_wrapper if hasattr(func, '__code__') and func.__code__.co_flags & 0x80 else sync_wrapper
+        finally:
+            _META.reset(token)
     
-    return decorator
+    return sync_wrapper
 
 
-def trace_agent_operation(name: str, operation_type: str = "span"):
+def _with_sampling(func: Callable, traced: Callable, is_async: bool) -> Callable:
     """
-    Decorator to trace individual agent operations
-    Usage: @trace_agent_operation("query_classification", "span")
+    Route calls to traced or to the bare func by head sampling.
+    The outermost traced call decides for the whole request; nested calls follow it.
     """
-    def decorator(func):
-        if not LANGFUSE_AVAILABLE or not langfuse_config.enabled:
-            return func
-        
-        @observe(name=name, as_type=operation_type)
+    if is_async:
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
-            return await func(*args, **kwargs)
-        
-        @observe(name=name, as_type=operation_type)
-        @functools.wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
+            sampled = _SAMPLED.get()
+            if sampled is not None:
+                return await (traced if sampled else func)(*args, **kwargs)
+            sampled = random.random() < _SAMPLE_RATE
+            token = _SAMPLED.set(sampled)
+            try:
+                return await (traced if sampled else func)(*args, **kwargs)
+            finally:
+                _SAMPLED.reset(token)
         
-        return async_wrapper if hasattr(func, '__code__') and func.__code__.co_flags & 0x80 else sync_wrapper
+        return async_wrapper
     
-    return decorator
+    @functools.wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        sampled = _SAMPLED.get()
+        if sampled is not None:
+            return (traced if sampled else func)(*args, **kwargs)
+        sampled = random.random() < _SAMPLE_RATE
+        token = _SAMPLED.set(sampled)
+        try:
+            return (traced if sampled else func)(*args, **kwargs)
+        finally:
+            _SAMPLED.reset(token)
+    
+    return sync_wrapper
 
 
-def trace_tool_execution(tool_name: str):
+def head_sampled(func: Callable, traced: Callable) -> Callable:
     """
-    Decorator to trace MCP tool executions
-    Usage: @trace_tool_execution("search_products")
+    Return traced, or with LANGFUSE_SAMPLE_RATE < 1 a wrapper that calls traced only
+    for sampled requests and the bare func otherwise. Shared by every tracing
+    decorator so one decision covers all spans of a request.
+    """
+    # An async generator's body runs after the wrapper returns, so it can't be routed
+    if _SAMPLE_RATE >= 1.0 or inspect.isasyncgenfunction(func):
+        return traced
+    return _with_sampling(func, traced, inspect.iscoroutinefunction(func))
+
+
+if LANGFUSE_AVAILABLE:
+    _sdk_observe = observe
+    
+    @functools.wraps(_sdk_observe)
+    def observe(func: Optional[Callable] = None, **kwargs):
+        """The SDK's @observe, skipped for requests dropped by head sampling"""
+        def decorator(fn):
+            return head_sampled(fn, _sdk_observe(**kwargs)(fn))
+        
+        return decorator if func is None else decorator(func)
+
+
+def _make_tracer(name: str, as_type: str = "span",
+                 extra_meta: Union[Dict[str, Any], Callable[[], Dict[str, Any]], None] = None):
+    """
+    Build a tracing decorator that wraps sync or async functions in @observe.
+    extra_meta (a dict, or a callable for per-call values) is layered onto the
+    current metadata context for the duration of the call.
     """
+    as_type = sys.intern(as_type)
+    if as_type not in _VALID_AS_TYPES:
+        raise ValueError(f"Invalid LangFuse as_type {as_type!r}; expected one of {sorted(_VALID_AS_TYPES)}")
+    get_meta = extra_meta if callable(extra_meta) else (lambda: extra_meta)
+    
     def decorator(func):
         if not LANGFUSE_AVAILABLE or not langfuse_config.enabled:
             return func
         
-        @observe(name=f"tool_{tool_name}", as_type="span")
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            return await func(*args, **kwargs)
-        
-        @observe(name=f"tool_{tool_name}", as_type="span")
-        @functools.wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        
-        return async_wrapper if hasattr(func, '__code__') and func.__code__.co_flags & 0x80 else sync_wrapper
+        # Decide once, on the undecorated function, and build only the wrappers needed.
+        # Without extra metadata, @observe wraps func directly.
+        is_async = inspect.iscoroutinefunction(func)
+        inner = func if extra_meta is None else _with_meta(func, get_meta, as_type, is_async)
+        traced = _sdk_observe(name=name, as_type=as_type)(inner)
+        return head_sampled(func, traced)
     
     return decorator
 
 
+def trace_conversation(name: str = "ai_conversation", user_id: str = "anonymous", session_id: Optional[str] = None):
+    """
+    Decorator to trace entire AI conversations
+    Usage: @trace_conversation(name="step4_dynamic_ui", user_id="user123")
+    """
+    # Everything but the timestamp is fixed at decoration time
+    static_meta = {
+        "step": "4_dynamic_ui",
+        "feature": "enhanced_agent",
+        "user_id": user_id,
+        "session_id": session_id or langfuse_config.session_id
+    }
+    
+    def conversation_meta() -> Dict[str, Any]:
+        return {**static_meta, "timestamp_us": time.time_ns() // 1000}
+    
+    return _make_tracer(name, "trace", conversation_meta)
+
+
+def trace_agent_operation(name: str, operation_type: str = "span"):
+    """
+    Decorator to trace individual agent operations
+    Usage: @trace_agent_operation("query_classification", "span")
+    """
+    return _make_tracer(name, operation_type)
+
+
+def trace_tool_execution(tool_name: str):
+    """
+    Decorator to trace MCP tool executions
+    Usage: @trace_tool_execution("search_products")
+    """
+    return _make_tracer(f"tool_{tool_name}")
+
+
 def trace_llm_generation(model_name: str = "unknown"):
     """
     Decorator to trace LLM generations
     Usage: @trace_llm_generation("gemma2:12b")
     """
-    def decorator(func):
-        if not LANGFUSE_AVAILABLE or not langfuse_config.enabled:
-            return func
-        
-        @observe(name="llm_generation", as_type="generation")
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # Add model info to metadata
-            if '_langfuse_metadata' not in kwargs:
-                kwargs['_langfuse_metadata'] = {}
-            kwargs['_langfuse_metadata']['model'] = model_name
-            return await func(*args, **kwargs)
-        
-        @observe(name="llm_generation", as_type="generation")
-        @functools.wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            # Add model info to metadata
-            if '_langfuse_metadata' not in kwargs:
-                kwargs['_langfuse_metadata'] = {}
-            kwargs['_langfuse_metadata']['model'] = model_name
-            return func(*args, **kwargs)
-        
-        return async_wrapper if hasattr(func, '__code__') and func.__code__.co_flags & 0x80 else sync_wrapper
-    
-    return decorator
+    return _make_tracer("llm_generation", "generation", {"model": model_name})
 
 
 def trace_ui_generation():
@@ -265,23 +419,7 @@ def trace_ui_generation():
     Decorator to trace UI component generation
     Usage: @trace_ui_generation()
     """
-    def decorator(func):
-        if not LANGFUSE_AVAILABLE or not langfuse_config.enabled:
-            return func
-        
-        @observe(name="ui_generation", as_type="span")
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            return await func(*args, **kwargs)
-        
-        @observe(name="ui_generation", as_type="span")
-        @functools.wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        
-        return async_wrapper if hasattr(func, '__code__') and func.__code__.co_flags & 0x80 else sync_wrapper
-    
-    return decorator
+    return _make_tracer("ui_generation")
 
 
 def trace_rag_operation(collection_type: str = "unknown"):
@@ -289,43 +427,32 @@ def trace_rag_operation(collection_type: str = "unknown"):
     Decorator to trace RAG/vector search operations
     Usage: @trace_rag_operation("business_rules")
     """
-    def decorator(func):
-        if not LANGFUSE_AVAILABLE or not langfuse_config.enabled:
-            return func
-        
-        @observe(name="rag_search", as_type="span")
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # Add collection info to metadata
-            if '_langfuse_metadata' not in kwargs:
-                kwargs['_langfuse_metadata'] = {}
-            kwargs['_langfuse_metadata']['collection'] = collection_type
-            kwargs['_langfuse_metadata']['vector_db'] = 'qdrant'
-            return await func(*args, **kwargs)
-        
-        @observe(name="rag_search", as_type="span") 
-        @functools.wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            # Add collection info to metadata
-            if '_langfuse_metadata' not in kwargs:
-                kwargs['_langfuse_metadata'] = {}
-            kwargs['_langfuse_metadata']['collection'] = collection_type
-            kwargs['_langfuse_metadata']['vector_db'] = 'qdrant'
-            return func(*args, **kwargs)
-        
-        return async_wrapper if hasattr(func, '__code__') and func.__code__.co_flags & 0x80 else sync_wrapper
-    
-    return decorator
+    return _make_tracer("rag_search", extra_meta={"collection": collection_type, "vector_db": "qdrant"})
 
 
 # Convenience functions for manual tracing
+def get_current_metadata() -> Dict[str, Any]:
+    """Get the metadata set by the enclosing trace_* decorators"""
+    return _META.get()
+
+
 def get_current_trace_id() -> Optional[str]:
     """Get the current trace ID if available"""
     # This would need to be implemented based on LangFuse's context management
     # For now, return a new UUID
-    return str(uuid.uuid4()) if langfuse_config.enabled else None
+    return _new_id() if langfuse_config.enabled else None
 
 
 def flush_observations():
-    """Flush all pending observations to LangFuse"""
-    langfuse_config.flush()
\ No newline at end of file
+    """Flush all pending observations to LangFuse (in the background unless LANGFUSE_ENFORCE_FLUSH=1)"""
+    langfuse_config.flush()
+
+def _identity_decorator(*args, **kwargs):
+    """Decorator factory used when LangFuse is off; returns functions unchanged"""
+    return lambda func: func
+
+
+# With observability off, skip tracer construction entirely at decoration time
+if not (LANGFUSE_AVAILABLE and langfuse_config.enabled):
+    trace_conversation = trace_agent_operation = trace_tool_execution = _identity_decorator
+    trace_llm_generation = trace_ui_generation = trace_rag_operation = _identity_decorator
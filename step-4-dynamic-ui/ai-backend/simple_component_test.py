@@ -3,6 +3,46 @@ Simple test to isolate the regex issue
 """
 import re
 
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+# Workflow keyword extraction pattern, compiled once
+_WORD_RE = re.compile(r'\b\w{3,}\b')
+
+
+def matching_pattern_ids(compiled_patterns, content):
+    """
+    Find which patterns match at all in one Hyperscan pass over content.
+    Returns None when Hyperscan is unavailable or rejects a pattern.
+    """
+    if not HYPERSCAN_AVAILABLE:
+        return None
+    
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[regex.pattern.encode() for regex, _ in compiled_patterns],
+            ids=list(range(len(compiled_patterns))),
+            elements=len(compiled_patterns),
+            # UTF8 + UCP keep \w and \s Unicode-aware like Python's re
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP]
+                  * len(compiled_patterns)
+        )
+    except hyperscan.error as e:
+        print(f"⚠️ Hyperscan compile failed, scanning each pattern: {e}")
+        return None
+    
+    hits = set()
+    
+    def on_match(pattern_id, start, end, flags, context):
+        hits.add(pattern_id)
+    
+    db.scan(content.encode(), match_event_handler=on_match)
+    return hits
+
 # Test the regex patterns that might be causing issues
 test_content = """
 import * as React from "react"
@@ -46,20 +86,28 @@ try:
         (r'useContext|createContext|Context\.Provider', "context pattern")
     ]
     
+    # Compile each pattern once up front; report compile errors per pattern
+    compiled_patterns = []
     for pattern, description in patterns_to_test:
         try:
-            matches = re.findall(pattern, test_content)
-            print(f"✅ {description}: {len(matches)} matches")
-            if matches:
-                print(f"   Matches: {matches[:3]}")  # Show first 3 matches
+            compiled_patterns.append((re.compile(pattern), description))
         except re.error as e:
             print(f"❌ {description}: REGEX ERROR - {e}")
             print(f"   Pattern: {pattern}")
     
+    # Single multi-pattern prefilter pass; only patterns that hit need findall for their groups
+    hits = matching_pattern_ids(compiled_patterns, test_content)
+    
+    for pattern_id, (regex, description) in enumerate(compiled_patterns):
+        matches = regex.findall(test_content) if hits is None or pattern_id in hits else []
+        print(f"✅ {description}: {len(matches)} matches")
+        if matches:
+            print(f"   Matches: {matches[:3]}")  # Show first 3 matches
+    
     print("\nTesting workflow keyword extraction...")
     workflow_text = "Display product information with pricing and add to cart"
     try:
-        words = re.findall(r'\b\w{3,}\b', workflow_text.lower())
+        words = _WORD_RE.findall(workflow_text.lower())
         print(f"✅ Workflow keywords: {words}")
     except re.error as e:
         print(f"❌ Workflow keyword extraction: REGEX ERROR - {e}")
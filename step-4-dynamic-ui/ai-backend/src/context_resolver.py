@@ -6,18 +6,48 @@ This module resolves contextual references like "last order", "my recent purchas
 """
 
 import asyncio
+import re
+import time
+from collections import OrderedDict, defaultdict
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime, timedelta
 from loguru import logger
 
+# Customer lookups are cached briefly; a session asks for the same customer on every message
+CUSTOMER_CACHE_SIZE = 1024
+CUSTOMER_CACHE_TTL = 60  # seconds
+
+_PRONOUNS = frozenset({'it', 'that', 'this', 'them', 'those', 'these'})
+
+# Whole-word pronouns only, so "edit" or "thistle" don't trigger pronoun resolution
+_PRONOUN_RE = re.compile(r'\b(?:' + '|'.join(sorted(_PRONOUNS)) + r')\b', re.IGNORECASE)
+
+# required_context key -> (resolved entity that satisfies it, missing-context label)
+_REQUIRED_CONTEXT_ENTITIES = {
+    'customer_id': ('customer', 'customer_authentication'),
+    'order_id': ('order_id', 'order_identification'),
+    'product_id': ('referenced_items', 'product_specification'),
+}
+
 class ContextResolver:
     """
     Resolves contextual references in user queries to concrete entities
     """
     
+    __slots__ = (
+        'mcp_tools', 'resolution_cache', '_customer_locks',
+        '_get_customer', '_get_orders', '_search_products', '_get_order'
+    )
+    
     def __init__(self, mcp_tools):
         self.mcp_tools = mcp_tools
-        self.resolution_cache = {}  # Cache resolved references per session
+        # Bound MCP calls used on the resolution hot path
+        self._get_customer = mcp_tools.get_customer_info
+        self._get_orders = mcp_tools.get_customer_orders
+        self._search_products = mcp_tools.search_products
+        self._get_order = mcp_tools.get_order
+        self.resolution_cache = OrderedDict()  # customer_id -> (expires_at, customer data), LRU order
+        self._customer_locks = defaultdict(asyncio.Lock)  # One in-flight lookup per customer
     
     async def resolve_references(self, intent: Dict[str, Any], session: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -39,45 +69,22 @@ class ContextResolver:
         }
         
         try:
-            # Resolve customer context first (most important)
-            if self._requires_customer_context(intent):
-                customer_context = await self._resolve_customer_context(session)
-                if customer_context:
-                    resolved['resolved_entities']['customer'] = customer_context
-                else:
-                    resolved['resolution_errors'].append("Customer not authenticated")
-                    resolved['resolution_status'] = 'partial'
-                    logger.warning(f"Customer context missing for intent: {intent['intent_type']}")
-            else:
-                # For intents that don't require customer context, add mock context if session has customer_id
-                customer_id = session.get('customer_id')
-                if customer_id:
-                    resolved['resolved_entities']['customer'] = {'id': customer_id, 'customer_id': customer_id}
-            
-            # Resolve temporal references (last order, recent purchases, etc.)
-            if intent.get('temporal_reference') != 'none':
-                temporal_entities = await self._resolve_temporal_reference(
-                    intent['temporal_reference'],
-                    intent['target_entity'],
-                    resolved.get('resolved_entities', {}).get('customer', {})
-                )
-                if temporal_entities:
-                    resolved['resolved_entities'].update(temporal_entities)
-            
-            # Resolve entity references (specific products, orders mentioned)
-            if intent.get('entity_references'):
-                entity_refs = await self._resolve_entity_references(
-                    intent['entity_references'],
-                    intent['target_entity']
-                )
-                if entity_refs:
-                    resolved['resolved_entities']['referenced_items'] = entity_refs
+            # Customer -> temporal is the only dependent chain; entity and pronoun
+            # resolution don't need the customer, so all three run concurrently.
+            # Order lookups are shared by every branch of this one call
+            order_lookups = {}
+            results = await asyncio.gather(
+                self._resolve_customer_and_temporal(intent, session, resolved, order_lookups),
+                self._resolve_entities_into(intent, resolved),
+                self._resolve_pronouns_into(intent, session, resolved),
+                return_exceptions=True
+            )
             
-            # Resolve pronoun references from conversation history
-            if self._has_pronoun_references(intent.get('action', '')):
-                pronoun_refs = await self._resolve_pronoun_references(session)
-                if pronoun_refs:
-                    resolved['resolved_entities']['pronoun_references'] = pronoun_refs
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Context resolution failed: {result}")
+                    resolved['resolution_status'] = 'failed'
+                    resolved['resolution_errors'].append(str(result))
             
             logger.info(f"Context resolution completed: {resolved['resolution_status']}")
             return resolved
@@ -88,6 +95,52 @@ class ContextResolver:
             resolved['resolution_errors'].append(str(e))
             return resolved
     
+    async def _resolve_customer_and_temporal(self, intent: Dict[str, Any], session: Dict[str, Any], resolved: Dict[str, Any],
+                                             order_lookups: Optional[Dict[tuple, asyncio.Future]] = None):
+        """Resolve customer context, then temporal references that depend on it"""
+        # Resolve customer context first (most important)
+        if self._requires_customer_context(intent):
+            customer_context = await self._resolve_customer_context(session)
+            if customer_context:
+                resolved['resolved_entities']['customer'] = customer_context
+            else:
+                resolved['resolution_errors'].append("Customer not authenticated")
+                resolved['resolution_status'] = 'partial'
+                logger.warning(f"Customer context missing for intent: {intent['intent_type']}")
+        else:
+            # For intents that don't require customer context, add mock context if session has customer_id
+            customer_id = session.get('customer_id')
+            if customer_id:
+                resolved['resolved_entities']['customer'] = {'id': customer_id, 'customer_id': customer_id}
+        
+        # Resolve temporal references (last order, recent purchases, etc.)
+        if intent.get('temporal_reference') != 'none':
+            temporal_entities = await self._resolve_temporal_reference(
+                intent['temporal_reference'],
+                intent['target_entity'],
+                resolved['resolved_entities'].get('customer', {}),
+                order_lookups
+            )
+            if temporal_entities:
+                resolved['resolved_entities'].update(temporal_entities)
+    
+    async def _resolve_entities_into(self, intent: Dict[str, Any], resolved: Dict[str, Any]):
+        """Resolve entity references (specific products, orders mentioned)"""
+        if intent.get('entity_references'):
+            entity_refs = await self._resolve_entity_references(
+                intent['entity_references'],
+                intent['target_entity']
+            )
+            if entity_refs:
+                resolved['resolved_entities']['referenced_items'] = entity_refs
+    
+    async def _resolve_pronouns_into(self, intent: Dict[str, Any], session: Dict[str, Any], resolved: Dict[str, Any]):
+        """Resolve pronoun references from conversation history"""
+        if self._has_pronoun_references(intent.get('action', '')):
+            pronoun_refs = await self._resolve_pronoun_references(session)
+            if pronoun_refs:
+                resolved['resolved_entities']['pronoun_references'] = pronoun_refs
+    
     def _requires_customer_context(self, intent: Dict[str, Any]) -> bool:
         """Check if intent requires customer authentication"""
         return 'customer_id' in intent.get('required_context', [])
@@ -100,21 +153,57 @@ class ContextResolver:
             customer_id = session.get('user_id')
         
         if customer_id:
+            cached = self._get_cached_customer(customer_id)
+            if cached is not None:
+                return cached
+            
+            lock = self._customer_locks[customer_id]
             try:
-                # Get full customer info from MCP tools
-                customer_info = await self.mcp_tools.get_customer_info(customer_id)
-                if customer_info.get('success'):
-                    return customer_info.get('data', {})
+                async with lock:
+                    # Another request may have filled the cache while we waited
+                    cached = self._get_cached_customer(customer_id)
+                    if cached is not None:
+                        return cached
+                    
+                    # Get full customer info from MCP tools
+                    customer_info = await self._get_customer(customer_id)
+                    if customer_info.get('success'):
+                        data = customer_info.get('data', {})
+                        self._cache_customer(customer_id, data)
+                        return data
             except Exception as e:
                 logger.error(f"Failed to get customer info: {e}")
+            finally:
+                if not lock.locked():
+                    self._customer_locks.pop(customer_id, None)
         
         return None
     
+    def _get_cached_customer(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        """Return cached customer data if present and not expired"""
+        entry = self.resolution_cache.get(customer_id)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if time.monotonic() >= expires_at:
+            del self.resolution_cache[customer_id]
+            return None
+        self.resolution_cache.move_to_end(customer_id)
+        return data
+    
+    def _cache_customer(self, customer_id: str, data: Dict[str, Any]):
+        """Store customer data, evicting the least recently used entry when full"""
+        self.resolution_cache[customer_id] = (time.monotonic() + CUSTOMER_CACHE_TTL, data)
+        self.resolution_cache.move_to_end(customer_id)
+        if len(self.resolution_cache) > CUSTOMER_CACHE_SIZE:
+            self.resolution_cache.popitem(last=False)
+    
     async def _resolve_temporal_reference(
         self, 
         temporal_type: str, 
         target_entity: str,
-        customer_context: Dict[str, Any]
+        customer_context: Dict[str, Any],
+        order_lookups: Optional[Dict[tuple, asyncio.Future]] = None
     ) -> Dict[str, Any]:
         """
         Resolve temporal references like 'last', 'recent', etc.
@@ -123,6 +212,7 @@ class ContextResolver:
             temporal_type: Type of temporal reference (last, recent, etc.)
             target_entity: Entity type being referenced (order, product, etc.)
             customer_context: Resolved customer information
+            order_lookups: Order lookups already made for this request, keyed by (customer_id, limit)
             
         Returns:
             Dictionary with resolved entities
@@ -139,14 +229,14 @@ class ContextResolver:
             if target_entity == 'order':
                 if temporal_type == 'last':
                     # Get the most recent order
-                    orders = await self.mcp_tools.get_customer_orders(customer_id, limit=1)
-                    if orders and orders.get('success') and orders.get('data'):
-                        resolved['last_order'] = orders['data'][0] if isinstance(orders['data'], list) else orders['data']
-                        resolved['order_id'] = resolved['last_order'].get('id')
+                    last_order = await self._get_last_order(customer_id, order_lookups)
+                    if last_order:
+                        resolved['last_order'] = last_order
+                        resolved['order_id'] = last_order.get('id')
                         
                 elif temporal_type == 'recent':
                     # Get recent orders (last 5)
-                    orders = await self.mcp_tools.get_customer_orders(customer_id, limit=5)
+                    orders = await self._fetch_orders(customer_id, 5, order_lookups)
                     if orders and orders.get('success'):
                         resolved['recent_orders'] = orders.get('data', [])
                         
@@ -158,12 +248,7 @@ class ContextResolver:
                 if temporal_type == 'last':
                     # Get last viewed/purchased product
                     # This might come from session history or order history
-                    last_order = resolved.get('last_order')
-                    if not last_order:
-                        orders = await self.mcp_tools.get_customer_orders(customer_id, limit=1)
-                        if orders and orders.get('success') and orders.get('data'):
-                            last_order = orders['data'][0] if isinstance(orders['data'], list) else orders['data']
-                    
+                    last_order = await self._get_last_order(customer_id, order_lookups)
                     if last_order and last_order.get('items'):
                         resolved['last_product'] = last_order['items'][0]
                         
@@ -176,6 +261,26 @@ class ContextResolver:
         
         return resolved
     
+    def _fetch_orders(self, customer_id: str, limit: int,
+                      order_lookups: Optional[Dict[tuple, asyncio.Future]]) -> Any:
+        """Awaitable customer orders, requested from MCP at most once per (customer_id, limit) in a request"""
+        if order_lookups is None:
+            return self._get_orders(customer_id, limit=limit)
+        
+        key = (customer_id, limit)
+        lookup = order_lookups.get(key)
+        if lookup is None:
+            lookup = order_lookups[key] = asyncio.ensure_future(self._get_orders(customer_id, limit=limit))
+        return lookup
+    
+    async def _get_last_order(self, customer_id: str,
+                              order_lookups: Optional[Dict[tuple, asyncio.Future]] = None) -> Optional[Dict[str, Any]]:
+        """Most recent order, sharing the MCP lookup with the rest of the request"""
+        orders = await self._fetch_orders(customer_id, 1, order_lookups)
+        if orders and orders.get('success') and orders.get('data'):
+            return orders['data'][0] if isinstance(orders['data'], list) else orders['data']
+        return None
+    
     async def _resolve_entity_references(self, references: List[str], entity_type: str) -> List[Dict[str, Any]]:
         """
         Resolve specific entity references mentioned in the query
@@ -187,43 +292,52 @@ class ContextResolver:
         Returns:
             List of resolved entities
         """
-        resolved = []
+        # One MCP round-trip per reference, all in flight at once
+        results = await asyncio.gather(
+            *(self._resolve_entity_reference(reference, entity_type) for reference in references),
+            return_exceptions=True
+        )
         
-        for reference in references:
-            try:
-                if entity_type == 'product':
-                    # Search for the product
-                    results = await self.mcp_tools.search_products(reference)
-                    if results and results.get('success') and results.get('data'):
-                        products = results['data']
-                        if products:
-                            resolved.append({
-                                'reference': reference,
-                                'type': 'product',
-                                'resolved_entity': products[0],
-                                'alternatives': products[1:3] if len(products) > 1 else []
-                            })
-                            
-                elif entity_type == 'order':
-                    # Check if it's an order ID
-                    if reference.startswith('#') or reference.upper().startswith('ORD'):
-                        order = await self.mcp_tools.get_order(reference.strip('#'))
-                        if order and order.get('success'):
-                            resolved.append({
-                                'reference': reference,
-                                'type': 'order',
-                                'resolved_entity': order.get('data')
-                            })
-                            
-            except Exception as e:
-                logger.error(f"Failed to resolve entity reference '{reference}': {e}")
+        resolved = []
+        for reference, result in zip(references, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to resolve entity reference '{reference}': {result}")
+            elif result:
+                resolved.append(result)
         
         return resolved
     
+    async def _resolve_entity_reference(self, reference: str, entity_type: str) -> Optional[Dict[str, Any]]:
+        """Resolve a single entity reference, or None if nothing matched"""
+        if entity_type == 'product':
+            # Search for the product
+            results = await self._search_products(reference)
+            if results and results.get('success') and results.get('data'):
+                products = results['data']
+                if products:
+                    return {
+                        'reference': reference,
+                        'type': 'product',
+                        'resolved_entity': products[0],
+                        'alternatives': products[1:3] if len(products) > 1 else []
+                    }
+                    
+        elif entity_type == 'order':
+            # Check if it's an order ID
+            if reference.startswith('#') or reference.upper().startswith('ORD'):
+                order = await self._get_order(reference.strip('#'))
+                if order and order.get('success'):
+                    return {
+                        'reference': reference,
+                        'type': 'order',
+                        'resolved_entity': order.get('data')
+                    }
+        
+        return None
+    
     def _has_pronoun_references(self, action: str) -> bool:
         """Check if the query contains pronoun references that need resolution"""
-        pronouns = ['it', 'that', 'this', 'them', 'those', 'these']
-        return any(pronoun in action.lower() for pronoun in pronouns)
+        return _PRONOUN_RE.search(action) is not None
     
     async def _resolve_pronoun_references(self, session: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -240,14 +354,16 @@ class ContextResolver:
         # Get the last mentioned entities from session
         conversation_history = session.get('conversation_history', [])
         if conversation_history:
-            last_interaction = conversation_history[-1] if conversation_history else {}
+            last_interaction = conversation_history[-1]
             
             # Extract entities from last interaction
             if last_interaction.get('entities'):
                 resolved['last_mentioned'] = last_interaction['entities']
             
-            # Look for specific entity types in recent history
-            for interaction in reversed(conversation_history[-3:]):  # Last 3 interactions
+            # Look for specific entity types in recent history (last 3 interactions, newest first)
+            last_index = len(conversation_history) - 1
+            for i in range(last_index, max(-1, last_index - 3), -1):
+                interaction = conversation_history[i]
                 if interaction.get('product_mentioned'):
                     resolved['last_product_mentioned'] = interaction['product_mentioned']
                     break
@@ -308,13 +424,10 @@ class ContextResolver:
         resolved_entities = resolved_context.get('resolved_entities', {})
         
         # Check required context from intent
-        for required in intent.get('required_context', []):
-            if required == 'customer_id' and not resolved_entities.get('customer'):
-                missing.append('customer_authentication')
-            elif required == 'order_id' and not resolved_entities.get('order_id'):
-                missing.append('order_identification')
-            elif required == 'product_id' and not resolved_entities.get('referenced_items'):
-                missing.append('product_specification')
+        required_context = frozenset(intent.get('required_context', ()))
+        for required, (entity, missing_item) in _REQUIRED_CONTEXT_ENTITIES.items():
+            if required in required_context and not resolved_entities.get(entity):
+                missing.append(missing_item)
         
         # Check for temporal resolution failures
         if intent.get('temporal_reference') != 'none':
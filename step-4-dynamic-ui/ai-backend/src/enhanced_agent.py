@@ -2,11 +2,22 @@
 Enhanced AI Agent for Step 4 - Dynamic UI Generation
 Combines RAG, transactional tools, and dynamic UI generation capabilities
 """
+import copy
 import json
 import time
 import sys
+import asyncio
 import os
-from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import functools
+import bisect
+import operator
+import re
+import reprlib
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+import numpy as np
+import orjson
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers import JsonOutputParser
 
@@ -32,16 +43,295 @@ from shared.observability.langfuse_decorator import (
 from shared.observability.hybrid_tracing import langfuse_trace
 from prompts.prompt_manager import prompt_manager
 
+try:
+    from langchain_community.cache import SQLiteCache
+    LLM_CACHE_AVAILABLE = True
+except ImportError:
+    SQLiteCache = object
+    LLM_CACHE_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
 logger = logging_config.get_logger(__name__)
+# Handlers are configured once at startup, so the level check is static
+_INFO_ENABLED = logging_config.is_enabled_for("INFO")
+
+_RESULT_FIELDS = operator.attrgetter("type", "content", "metadata", "score")
+# Query types whose routes always use the transactional plan, so it is started before RAG returns
+_SPECULATIVE_PLAN_QUERY_TYPES = frozenset({QueryType.TRANSACTIONAL, QueryType.MIXED})
+_JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+# Bounded repr for tool result samples in the response prompt; caps each level
+# so a large record is never rendered in full just to be sliced to 200 chars
+_SAMPLE_REPR = reprlib.Repr()
+_SAMPLE_REPR.maxlevel = 3
+_SAMPLE_REPR.maxdict = 8
+_SAMPLE_REPR.maxlist = 3
+_SAMPLE_REPR.maxstring = 40
+_SAMPLE_REPR.maxother = 40
+
+
+def _compile_literal_db(words: Tuple[str, ...]):
+    """
+    Compile literal words into one case-insensitive Hyperscan database.
+    Returns None when Hyperscan is unavailable or rejects a pattern.
+    """
+    if not HYPERSCAN_AVAILABLE:
+        return None
+    
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[re.escape(word).encode() for word in words],
+            ids=list(range(len(words))),
+            elements=len(words),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(words)
+        )
+    except hyperscan.error as e:
+        logger.warning(f"Hyperscan compile failed, falling back to regex: {e}")
+        return None
+    return db
+
+
+def _stop_on_match(pattern_id, start, end, flags, context):
+    # A truthy return ends the scan at the first hit (raised as ScanTerminated)
+    return True
+
+
+def _literal_db_matches(db, text: str) -> bool:
+    """Whether any literal compiled into db occurs in text, in one pass"""
+    try:
+        db.scan(text.encode(), match_event_handler=_stop_on_match)
+    except hyperscan.ScanTerminated:
+        return True
+    return False
+
+
+# Unit embeddings are stored as int8 scaled by 127, so an integer dot product
+# divided by 127**2 is the cosine similarity
+_QUANT_SCALE = 127
+_QUANT_SCALE_SQ = float(_QUANT_SCALE * _QUANT_SCALE)
+
+
+def _quantize(embedding: np.ndarray) -> np.ndarray:
+    """Quantize a unit-length float embedding to int8"""
+    return np.round(embedding * _QUANT_SCALE).astype(np.int8)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def argmin_cosine(keys: np.ndarray, q: np.ndarray) -> Tuple[int, float]:
+        """Index and cosine distance of the int8 row in keys closest to int8 vector q"""
+        best_idx = -1
+        best_dot = -(1 << 30)
+        for i in range(keys.shape[0]):
+            dot = 0
+            for d in range(keys.shape[1]):
+                dot += np.int32(keys[i, d]) * np.int32(q[d])
+            if dot > best_dot:
+                best_dot = dot
+                best_idx = i
+        return best_idx, 1.0 - best_dot / _QUANT_SCALE_SQ
+else:
+    def argmin_cosine(keys: np.ndarray, q: np.ndarray) -> Tuple[int, float]:
+        """Index and cosine distance of the int8 row in keys closest to int8 vector q"""
+        dots = np.einsum("ij,j->i", keys, q, dtype=np.int32)
+        best_idx = int(np.argmax(dots))
+        return best_idx, 1.0 - dots[best_idx] / _QUANT_SCALE_SQ
+
+
+class _PlanSlab:
+    """Contiguous int8 matrix of one customer's cached query embeddings"""
+    
+    __slots__ = ("vectors", "keys", "rows")
+    
+    def __init__(self, dim: int, capacity: int = 8):
+        self.vectors = np.empty((capacity, dim), dtype=np.int8)
+        self.keys: List[Tuple[Optional[str], str]] = []
+        self.rows: Dict[Tuple[Optional[str], str], int] = {}
+    
+    def add(self, key: Tuple[Optional[str], str], embedding: np.ndarray) -> None:
+        size = len(self.keys)
+        if size == self.vectors.shape[0]:
+            # Grow in power-of-two steps to amortize reallocation
+            grown = np.empty((size * 2, self.vectors.shape[1]), dtype=np.int8)
+            grown[:size] = self.vectors
+            self.vectors = grown
+        self.vectors[size] = _quantize(embedding)
+        self.rows[key] = size
+        self.keys.append(key)
+    
+    def update(self, key: Tuple[Optional[str], str], embedding: np.ndarray) -> None:
+        self.vectors[self.rows[key]] = _quantize(embedding)
+    
+    def remove(self, key: Tuple[Optional[str], str]) -> None:
+        # Swap the last row into the freed slot to keep the matrix dense
+        row = self.rows.pop(key)
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.vectors[row] = self.vectors[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+        self.keys.pop()
+    
+    def nearest(self, embedding: np.ndarray) -> Tuple[Tuple[Optional[str], str], float]:
+        best_idx, best_dist = argmin_cosine(self.vectors[:len(self.keys)], _quantize(embedding))
+        return self.keys[best_idx], best_dist
+
+
+class IncrementalJsonParser:
+    """
+    Find the first balanced {...} object in text arriving in chunks
+    
+    Scanner state (depth, string/escape flags, absolute offsets) persists across
+    feed() calls, so each chunk is scanned once and a stream of n characters
+    costs O(n) overall instead of re-parsing the accumulated text per chunk.
+    """
+    
+    __slots__ = ("_parts", "_offset", "_start", "_end", "_depth", "_in_string", "_escape", "result")
+    
+    def __init__(self):
+        self._parts: List[str] = []
+        self._offset = 0      # absolute position of the next chunk
+        self._start = -1      # absolute position of the opening '{'
+        self._end = -1        # absolute position just past the closing '}'
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.result: Optional[Dict[str, Any]] = None
+    
+    @property
+    def done(self) -> bool:
+        return self._end != -1
+    
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """Consume a chunk; return the parsed object once it is complete, else None"""
+        if self.done:
+            return self.result
+        
+        self._parts.append(chunk)
+        i = 0
+        if self._start == -1:
+            i = chunk.find("{")
+            if i == -1:
+                self._offset += len(chunk)
+                return None
+            self._start = self._offset + i
+        
+        depth, in_string, escape = self._depth, self._in_string, self._escape
+        for i in range(i, len(chunk)):
+            char = chunk[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    self._end = self._offset + i + 1
+                    break
+        self._depth, self._in_string, self._escape = depth, in_string, escape
+        self._offset += len(chunk)
+        
+        if self.done:
+            text = self.object_text()
+            try:
+                self.result = orjson.loads(text)
+            except orjson.JSONDecodeError as e:
+                logger.error(f"Failed to parse JSON object: {e}")
+        return self.result
+    
+    def object_text(self) -> Optional[str]:
+        """Text of the completed object, or None while it is still open"""
+        if not self.done:
+            return None
+        return "".join(self._parts)[self._start:self._end]
+
+
+@functools.lru_cache(maxsize=2048)
+def _data_summary(strategy: str, has_tool_results: bool, tool_sig: Tuple[Tuple[str, Optional[str], int], ...]) -> str:
+    """Render the UI-generation data summary for a strategy and tool result signature"""
+    if not has_tool_results:
+        return f"Query Strategy: {strategy}"
+    
+    lines = "".join(
+        f"\n  - {tool_name}: {size} {unit}" if unit else f"\n  - {tool_name}: data available"
+        for tool_name, unit, size in tool_sig
+    )
+    return f"Query Strategy: {strategy}\n\nData Available:{lines}"
+
+
+class PromptDigestCache(SQLiteCache):
+    """SQLite LLM cache keyed by a blake2b digest of the prompt rather than its full text"""
+    
+    @staticmethod
+    def _digest(prompt: str) -> str:
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def lookup(self, prompt: str, llm_string: str):
+        return super().lookup(self._digest(prompt), llm_string)
+    
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        super().update(self._digest(prompt), llm_string, return_val)
+
+
+# Planning prompts (temperature 0.1) repeat often enough that identical
+# (prompt, model, temperature) calls are served from disk. llm_string already
+# carries model and temperature, so only the prompt needs hashing.
+if LLM_CACHE_AVAILABLE and os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+    _PLANNING_LLM_CACHE = PromptDigestCache(database_path=os.getenv("LLM_CACHE_PATH", ".llm_cache.db"))
+else:
+    _PLANNING_LLM_CACHE = None
 
 class EnhancedAgent:
     """Enhanced AI agent with RAG and Dynamic UI Generation capabilities"""
     
+    # Priority order for component categories in the UI generation prompt
+    PRIORITY_COMPONENT_CATEGORIES = ("form", "layout", "data", "feedback", "navigation")
+    
+    # UI-beneficial query patterns and data-rich strategies for _should_generate_ui
+    UI_TRIGGERS = (
+        "show", "display", "list", "find", "search", "view", "see",
+        "products", "orders", "customers", "buy", "purchase", "cart"
+    )
+    UI_DATA_STRATEGIES = ("product_search", "order_inquiry", "customer_lookup", "transactional")
+    # Single-pass alternations over the tuples above (plain substring semantics, no word boundaries);
+    # the trigger match ignores case so the query is never lowercased for it
+    _UI_TRIGGER_RE = re.compile("|".join(map(re.escape, UI_TRIGGERS)), re.IGNORECASE)
+    _UI_DATA_STRATEGY_RE = re.compile("|".join(map(re.escape, UI_DATA_STRATEGIES)))
+    # Hyperscan DFA over the same triggers when available; None falls back to _UI_TRIGGER_RE
+    _UI_TRIGGER_DB = _compile_literal_db(UI_TRIGGERS)
+    
     def __init__(self, traditional_api_url: str = "http://localhost:4000"):
         self.llm_config = LLMConfig()
+        self._model_name = self.llm_config.get_info()["model"]
+        self._log_llm = langfuse_client.log_llm_generation
         self.llm = self.llm_config.get_llm(temperature=0.1)
-        self.response_llm = self.llm_config.get_llm(temperature=0.3)
-        self.ui_llm = self.llm_config.get_llm(temperature=0.1)  # Dedicated LLM for UI generation
+        # Planning gets its own instance so the disk cache never applies to the shared
+        # self.llm used for intent classification and orchestration
+        self.planning_llm = self.llm
+        if _PLANNING_LLM_CACHE is not None:
+            self.planning_llm = self.llm_config.get_llm(temperature=0.1)
+            self.planning_llm.cache = _PLANNING_LLM_CACHE
+        # response_llm and ui_llm are built on first use (see the properties below)
         self.json_parser = JsonOutputParser()
         
         # Initialize tools and services
@@ -49,43 +339,98 @@ class EnhancedAgent:
         self.ui_component_tools = UIComponentTools()
         self.rag_service = RAGService()
         
-        # Simple in-memory session storage
-        self.sessions = {}
+        # In-memory session storage, bounded LRU so idle sessions are evicted
+        self.sessions = OrderedDict()
+        self.max_sessions = int(os.getenv("MAX_SESSIONS", "10000"))
         
         # Query classification thresholds
         self.knowledge_confidence_threshold = 0.7
         self.mixed_query_threshold = 0.5
-        
-        # UI generation capabilities
+        self._build_routing_table()
+        
+        # Approximate plan cache: (customer_id, query) -> plan in LRU order, with the
+        # query embeddings kept per customer in contiguous slabs. A lookup hits when
+        # the cosine distance to a cached query is within tau
+        self._plan_cache = OrderedDict()
+        self._plan_slabs: Dict[Optional[str], _PlanSlab] = {}
+        self._plan_cache_capacity = 512
+        self._tau = 0.15
+        
+        # Query embeddings requested within a short window are encoded in one batch
+        self._pending_embeddings: List[Tuple[str, asyncio.Future]] = []
+        self._embed_batch_window = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000
+        self._embed_flush_task = None
+        
+        # UI generation capabilities. The library is kept as two views: component_library
+        # holds the full per-component metadata (used to build the prompt summary), and
+        # _component_types only the names, which is all the per-request validation touches
         self.component_library = None
+        self._component_types: frozenset = frozenset()
+        self._component_summary_cache: Optional[str] = None
         self.ui_generation_enabled = True
         
+        # Per-call LLM timeouts (seconds) so a slow UI generation can't stall the text response
+        self.response_timeout = 60.0
+        self.ui_generation_timeout = 30.0
+        
         # Initialize component library
         self._initialize_ui_capabilities()
         
         # Initialize intelligent query processing
         self.intent_classifier = IntentClassifier(self.llm)
         self.context_resolver = ContextResolver(self.mcp_tools)
-        self.intelligent_orchestrator = IntelligentOrchestrator(self.llm, self.mcp_tools)
+        self.intelligent_orchestrator = IntelligentOrchestrator(
+            self.llm, self.mcp_tools, planning_llm=self.planning_llm
+        )
         self.ui_component_tools = UIComponentTools()
+        
+        # Tool name -> coroutine function; tools without parameters ignore any the planner sends
+        self._tool_dispatch = {
+            "search_products": self._search_products_tool,
+            "get_products": self.mcp_tools.get_products,
+            "get_customers": lambda **_: self.mcp_tools.get_customers(),
+            "get_customer_orders": self.mcp_tools.get_customer_orders,
+            "create_order": self.mcp_tools.create_order,
+            "get_categories": lambda **_: self.mcp_tools.get_categories(),
+        }
+    
+    @functools.cached_property
+    def response_llm(self):
+        """LLM for final response generation, created on first use"""
+        # Response generation stays uncached so replies keep their variety
+        return self.llm_config.get_llm(temperature=0.3)
+    
+    @functools.cached_property
+    def ui_llm(self):
+        """Dedicated LLM for UI generation, never created when UI generation is off"""
+        ui_llm = self.llm_config.get_llm(temperature=0.1)
+        if _PLANNING_LLM_CACHE is not None:
+            ui_llm.cache = _PLANNING_LLM_CACHE
+        return ui_llm
     
     def get_session_state(self, session_id: str) -> Dict[str, Any]:
-        """Get session state - simple in-memory storage"""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {
-                "customer_id": None,
-                "last_search": None,
-                "order_context": None,
-                "knowledge_context": None,
-                "conversation_history": []
-            }
-        return self.sessions[session_id]
+        """Get session state - in-memory LRU storage"""
+        state = self.sessions.get(session_id)
+        if state is not None:
+            self.sessions.move_to_end(session_id)
+            return state
+        
+        state = self.sessions[session_id] = {
+            "customer_id": None,
+            "last_search": None,
+            "order_context": None,
+            "knowledge_context": None,
+            "conversation_history": []
+        }
+        if len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return state
     
     def update_session_state(self, session_id: str, updates: Dict[str, Any]):
         """Update session state"""
         state = self.get_session_state(session_id)
         state.update(updates)
-        logger.info(f"Updated session {session_id}: {updates}")
+        logger.debug("Updated session {}: {}", session_id, updates)
     
     @langfuse_trace(name="orchestration_processing")
     async def process_query_with_orchestration(self, user_query: str, context: Dict[str, Any] = None, trace_id: str = None) -> Dict[str, Any]:
@@ -234,45 +579,104 @@ class EnhancedAgent:
         if context and "customerId" in context:
             session_state["customer_id"] = context["customerId"]
         
-        logger.info(
-            "Processing enhanced query",
-            user_query=user_query,
-            session_id=session_id,
-            trace_id=trace_id,
-            customer_id=session_state.get("customer_id")
-        )
+        if _INFO_ENABLED:
+            logger.info(
+                "Processing enhanced query",
+                user_query=user_query,
+                session_id=session_id,
+                trace_id=trace_id,
+                customer_id=session_state.get("customer_id")
+            )
         
         start_time = time.time()
         
+        # Step 0: Reuse the plan of a near-identical recent query. The cache is an
+        # optimisation only, so an embedding or lookup failure just bypasses it.
+        # Anonymous sessions would all share one slab, so they are never cached
+        customer_id = session_state.get("customer_id")
+        query_embedding = None
+        cached = None
+        if customer_id is not None:
+            try:
+                query_embedding = await self._embed_query(user_query)
+                cached = self._lookup_cached_plan(customer_id, query_embedding)
+            except Exception as e:
+                logger.warning("Plan cache lookup failed, planning from scratch",
+                              error=str(e), session_id=session_id)
+        
+        if cached is not None:
+            cached_plan, knowledge_context = cached
+            if knowledge_context is not None:
+                session_state["knowledge_context"] = {**knowledge_context, "query": user_query}
+            logger.info("Execution plan served from cache",
+                       session_id=session_id,
+                       duration_ms=(time.time() - start_time) * 1000)
+            return cached_plan
+        
         try:
-            # Step 1: Query RAG service for knowledge base search
-            rag_response = await self.rag_service.process_query(user_query, context)
-            
-            # Step 2: Determine query routing strategy
-            routing_decision = await self.determine_routing_strategy(
-                user_query, rag_response, session_state, trace_id
-            )
-            
-            # Step 3: Create execution plan based on routing
-            execution_plan = await self.create_execution_plan(
-                user_query, routing_decision, rag_response, session_state, trace_id
-            )
+            # Step 1: Query RAG service for knowledge base search, overlapping it with
+            # work that does not depend on the RAG result: loading the component
+            # library if it is not loaded yet, and speculatively planning transactional
+            # tools for the query types that always route to them. The keyword
+            # classification is cheap, so FAQ and business-rule queries, which usually
+            # end up knowledge-only, don't pay for a planning LLM call up front
+            transactional_task = None
+            if await self.rag_service.classify_query(user_query) in _SPECULATIVE_PLAN_QUERY_TYPES:
+                transactional_task = asyncio.create_task(
+                    self._create_transactional_plan(
+                        user_query, session_state, trace_id,
+                        bypass_llm_cache=bool(context and context.get("bypass_llm_cache"))
+                    )
+                )
+            try:
+                rag_query = self.rag_service.process_query(user_query, context)
+                if self.component_library is None:
+                    rag_response, _ = await asyncio.gather(rag_query, self._ensure_component_knowledge())
+                else:
+                    rag_response = await rag_query
+                
+                # Step 2: Determine query routing strategy
+                routing_decision = await self.determine_routing_strategy(
+                    user_query, rag_response, session_state, trace_id
+                )
+                
+                # Step 3: Create execution plan based on routing
+                execution_plan = await self.create_execution_plan(
+                    user_query, routing_decision, rag_response, session_state, trace_id,
+                    transactional_plan=transactional_task
+                )
+            finally:
+                # Knowledge-only strategies never consume the speculative plan
+                if transactional_task is not None:
+                    if not transactional_task.done():
+                        transactional_task.cancel()
+                    elif not transactional_task.cancelled():
+                        # Retrieve an unconsumed failure so asyncio does not warn about it
+                        transactional_task.exception()
             
             # Update session with knowledge context
+            knowledge_context = None
             if rag_response.results:
-                session_state["knowledge_context"] = {
+                knowledge_context = {
                     "query": user_query,
                     "results": [r.metadata for r in rag_response.results],
                     "confidence": rag_response.confidence
                 }
+                session_state["knowledge_context"] = knowledge_context
             
-            total_duration = (time.time() - start_time) * 1000
-            logger.info("Enhanced query processing completed", 
-                       total_duration_ms=total_duration, 
-                       session_id=session_id,
-                       query_type=rag_response.query_type.value,
-                       routing_strategy=routing_decision["strategy"])
+            if _INFO_ENABLED:
+                logger.info("Enhanced query processing completed", 
+                           total_duration_ms=(time.time() - start_time) * 1000, 
+                           session_id=session_id,
+                           query_type=rag_response.query_type.value,
+                           routing_strategy=routing_decision["strategy"])
             
+            if query_embedding is not None:
+                try:
+                    self._store_cached_plan(customer_id, user_query, query_embedding,
+                                            execution_plan, knowledge_context)
+                except Exception as e:
+                    logger.warning("Failed to cache execution plan", error=str(e), session_id=session_id)
             return execution_plan
             
         except Exception as e:
@@ -284,9 +688,9 @@ class EnhancedAgent:
             
             # Log error to LangFuse
             if trace_id:
-                langfuse_client.log_llm_generation(
+                self._log_llm(
                     trace_id=trace_id,
-                    model=self.llm_config.get_info()["model"],
+                    model=self._model_name,
                     prompt=user_query,
                     response="",
                     metadata={"error": str(e), "duration_ms": total_duration}
@@ -294,6 +698,126 @@ class EnhancedAgent:
             
             return self._fallback_response(user_query)
     
+    async def _embed_query(self, user_query: str) -> np.ndarray:
+        """Embed a query, coalescing near-concurrent requests into one embed_batch call"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_embeddings.append((user_query, future))
+        if len(self._pending_embeddings) == 1:
+            loop.call_later(self._embed_batch_window, self._start_embedding_flush)
+        return await future
+    
+    def _start_embedding_flush(self) -> None:
+        # Hold a reference so the flush task isn't garbage collected mid-flight
+        self._embed_flush_task = asyncio.create_task(self._flush_embeddings())
+    
+    async def _flush_embeddings(self) -> None:
+        """Encode every pending query in a single batch off the event loop"""
+        pending, self._pending_embeddings = self._pending_embeddings, []
+        try:
+            embeddings = await asyncio.to_thread(self.rag_service.embed_batch, [text for text, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(pending, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+    
+    def reembed_plan_cache(self) -> None:
+        """Re-embed every cached query in one batch, e.g. after switching embedding models"""
+        if not self._plan_cache:
+            return
+        keys = list(self._plan_cache)
+        embeddings = self.rag_service.embed_batch([user_query for _, user_query in keys])
+        # Rebuild the slabs, since the embedding dimension may have changed
+        self._plan_slabs = {}
+        for key, embedding in zip(keys, embeddings):
+            self._plan_slab(key[0], embedding.shape[0]).add(key, embedding)
+    
+    def _plan_slab(self, customer_id: Optional[str], dim: int) -> "_PlanSlab":
+        """Get or create the embedding slab holding a customer's cached plans"""
+        slab = self._plan_slabs.get(customer_id)
+        if slab is None:
+            slab = self._plan_slabs[customer_id] = _PlanSlab(dim)
+        return slab
+    
+    def _lookup_cached_plan(self, customer_id: Optional[str],
+                            query_embedding: np.ndarray) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Return copies of the (plan, knowledge context) cached closest to the query, if within tau"""
+        if customer_id is None:
+            return None
+        
+        # Only compare against plans built for the same customer
+        slab = self._plan_slabs.get(customer_id)
+        if slab is None:
+            return None
+        
+        key, dist = slab.nearest(query_embedding)
+        if dist > self._tau:
+            return None
+        
+        self._plan_cache.move_to_end(key)
+        # Deep copies so callers mutating tool_calls/parameters can't alter the cached entry
+        return copy.deepcopy(self._plan_cache[key])
+    
+    def _store_cached_plan(self, customer_id: Optional[str], user_query: str,
+                           query_embedding: np.ndarray, execution_plan: Dict[str, Any],
+                           knowledge_context: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Insert a freshly built plan and its knowledge context, evicting the least recently used entry.
+        Plans of anonymous sessions (no customer_id) are not cached.
+        """
+        if customer_id is None:
+            return
+        
+        key = (customer_id, user_query)
+        slab = self._plan_slab(customer_id, query_embedding.shape[0])
+        if key in self._plan_cache:
+            slab.update(key, query_embedding)
+        else:
+            slab.add(key, query_embedding)
+        self._plan_cache[key] = copy.deepcopy((execution_plan, knowledge_context))
+        self._plan_cache.move_to_end(key)
+        
+        if len(self._plan_cache) > self._plan_cache_capacity:
+            evicted, _ = self._plan_cache.popitem(last=False)
+            evicted_slab = self._plan_slabs[evicted[0]]
+            evicted_slab.remove(evicted)
+            if not evicted_slab.keys:
+                del self._plan_slabs[evicted[0]]
+    
+    def _route(self, query_type: QueryType, has_knowledge_results: bool, knowledge_confidence: float) -> Tuple[str, str]:
+        """Routing rules as (strategy, reasoning); evaluated once per table cell"""
+        if query_type == QueryType.TRANSACTIONAL:
+            return "transactional_only", "Query is purely transactional - route to MCP tools"
+        elif query_type == QueryType.FAQ and has_knowledge_results and knowledge_confidence > self.knowledge_confidence_threshold:
+            return "knowledge_only", "High confidence FAQ match - use knowledge base only"
+        elif query_type == QueryType.BUSINESS_RULE and has_knowledge_results:
+            return "knowledge_with_context", "Business rule query - use knowledge base with session context"
+        elif query_type == QueryType.MIXED or (has_knowledge_results and knowledge_confidence > self.mixed_query_threshold):
+            return "hybrid", "Mixed query - combine knowledge base with transactional tools"
+        else:
+            return "transactional_fallback", "Low confidence knowledge match - fallback to transactional tools"
+    
+    def _build_routing_table(self):
+        """
+        Precompute routing decisions for every (query type, has results, confidence tier)
+        
+        Must be called again after changing either confidence threshold.
+        """
+        self._routing_thresholds = sorted((self.mixed_query_threshold, self.knowledge_confidence_threshold))
+        # One confidence per tier: exceeding none, the lower, and both thresholds
+        low, high = self._routing_thresholds
+        representatives = (low, high, high + 1.0)
+        self._routing_table = {
+            (query_type, has_results, tier): self._route(query_type, has_results, confidence)
+            for query_type in QueryType
+            for has_results in (False, True)
+            for tier, confidence in enumerate(representatives)
+        }
+    
     @observe(as_type="span")
     async def determine_routing_strategy(self, 
                                        user_query: str, 
@@ -313,26 +837,14 @@ class EnhancedAgent:
             Routing decision with strategy and reasoning
         """
         # Analyze RAG results
-        has_knowledge_results = len(rag_response.results) > 0
+        knowledge_results_count = len(rag_response.results)
+        has_knowledge_results = knowledge_results_count > 0
         knowledge_confidence = rag_response.confidence
         query_type = rag_response.query_type
         
-        # Determine routing strategy
-        if query_type == QueryType.TRANSACTIONAL:
-            strategy = "transactional_only"
-            reasoning = "Query is purely transactional - route to MCP tools"
-        elif query_type == QueryType.FAQ and has_knowledge_results and knowledge_confidence > self.knowledge_confidence_threshold:
-            strategy = "knowledge_only"
-            reasoning = "High confidence FAQ match - use knowledge base only"
-        elif query_type == QueryType.BUSINESS_RULE and has_knowledge_results:
-            strategy = "knowledge_with_context"
-            reasoning = "Business rule query - use knowledge base with session context"
-        elif query_type == QueryType.MIXED or (has_knowledge_results and knowledge_confidence > self.mixed_query_threshold):
-            strategy = "hybrid"
-            reasoning = "Mixed query - combine knowledge base with transactional tools"
-        else:
-            strategy = "transactional_fallback"
-            reasoning = "Low confidence knowledge match - fallback to transactional tools"
+        # Determine routing strategy: the confidence tier is the number of thresholds it exceeds
+        tier = bisect.bisect_left(self._routing_thresholds, knowledge_confidence)
+        strategy, reasoning = self._routing_table[(query_type, has_knowledge_results, tier)]
         
         routing_decision = {
             "strategy": strategy,
@@ -340,10 +852,11 @@ class EnhancedAgent:
             "query_type": query_type.value,
             "knowledge_confidence": knowledge_confidence,
             "has_knowledge_results": has_knowledge_results,
-            "knowledge_results_count": len(rag_response.results)
+            "knowledge_results_count": knowledge_results_count
         }
         
-        logger.info("Routing decision made", **routing_decision)
+        if _INFO_ENABLED:
+            logger.info("Routing decision made", **routing_decision)
         return routing_decision
     
     @observe(as_type="span")
@@ -352,7 +865,8 @@ class EnhancedAgent:
                                   routing_decision: Dict[str, Any],
                                   rag_response,
                                   session_state: Dict[str, Any],
-                                  trace_id: str = None) -> Dict[str, Any]:
+                                  trace_id: str = None,
+                                  transactional_plan: Optional[asyncio.Task] = None) -> Dict[str, Any]:
         """
         Create execution plan based on routing decision
         
@@ -362,6 +876,7 @@ class EnhancedAgent:
             rag_response: RAG service response
             session_state: Session state
             trace_id: Tracing ID
+            transactional_plan: Speculatively started transactional plan, reused if needed
             
         Returns:
             Execution plan with tools and knowledge
@@ -371,34 +886,51 @@ class EnhancedAgent:
         if strategy == "knowledge_only":
             return await self._create_knowledge_only_plan(user_query, rag_response, trace_id)
         elif strategy == "transactional_only":
-            return await self._create_transactional_plan(user_query, session_state, trace_id)
+            return await self._resolve_transactional_plan(user_query, session_state, trace_id, transactional_plan)
         elif strategy == "hybrid":
-            return await self._create_hybrid_plan(user_query, rag_response, session_state, trace_id)
+            return await self._create_hybrid_plan(user_query, rag_response, session_state, trace_id, transactional_plan)
         elif strategy == "knowledge_with_context":
             return await self._create_knowledge_context_plan(user_query, rag_response, session_state, trace_id)
         else:  # transactional_fallback
-            return await self._create_transactional_plan(user_query, session_state, trace_id)
+            return await self._resolve_transactional_plan(user_query, session_state, trace_id, transactional_plan)
+    
+    async def _resolve_transactional_plan(self, user_query: str, session_state: Dict[str, Any],
+                                          trace_id: str = None,
+                                          transactional_plan: Optional[asyncio.Task] = None) -> Dict[str, Any]:
+        """Await the speculative transactional plan, or build one if none was started"""
+        if transactional_plan is not None:
+            return await transactional_plan
+        return await self._create_transactional_plan(user_query, session_state, trace_id)
+    
+    @staticmethod
+    def _serialize_results(rag_response) -> List[Dict[str, Any]]:
+        """Serialize RAG search results for an execution plan, once per RAG response"""
+        serialized = getattr(rag_response, "_serialized", None)
+        if serialized is None:
+            serialized = [
+                {"type": type_, "content": content, "metadata": metadata, "score": score}
+                for type_, content, metadata, score in map(_RESULT_FIELDS, rag_response.results)
+            ]
+            setattr(rag_response, "_serialized", serialized)
+        return serialized
     
     async def _create_knowledge_only_plan(self, user_query: str, rag_response, trace_id: str = None) -> Dict[str, Any]:
         """Create plan for knowledge-only responses"""
         return {
             "strategy": "knowledge_only",
             "tool_calls": [],
-            "knowledge_results": [
-                {
-                    "type": result.type,
-                    "content": result.content,
-                    "metadata": result.metadata,
-                    "score": result.score
-                } for result in rag_response.results
-            ],
+            "knowledge_results": self._serialize_results(rag_response),
             "response_strategy": "Use knowledge base results to answer user question directly",
             "session_updates": {},
             "context": rag_response.context
         }
     
-    async def _create_transactional_plan(self, user_query: str, session_state: Dict[str, Any], trace_id: str = None) -> Dict[str, Any]:
-        """Create plan for transactional queries (same as Step 1)"""
+    async def _create_transactional_plan(self, user_query: str, session_state: Dict[str, Any], trace_id: str = None,
+                                         bypass_llm_cache: bool = False) -> Dict[str, Any]:
+        """Create plan for transactional queries (same as Step 1)
+
+        bypass_llm_cache sends a request being debugged straight to the model.
+        """
         # Use LLM to determine transactional tools
         system_prompt = prompt_manager.get_transactional_system_prompt()
         user_prompt = prompt_manager.get_transactional_user_prompt(user_query, session_state)
@@ -409,7 +941,8 @@ class EnhancedAgent:
         ]
         
         llm_start_time = time.time()
-        response = await self.llm.ainvoke(messages)
+        llm = self.llm if bypass_llm_cache else self.planning_llm
+        response = await llm.ainvoke(messages)
         
         # Handle different response types
         if hasattr(response, 'content'):
@@ -422,9 +955,9 @@ class EnhancedAgent:
         llm_duration = (time.time() - llm_start_time) * 1000
         
         # Log LLM call to LangFuse
-        langfuse_client.log_llm_generation(
+        self._log_llm(
             trace_id=trace_id,
-            model=self.llm_config.get_info()["model"],
+            model=self._model_name,
             prompt=user_prompt,
             response=llm_response,
             usage={"total_tokens": len(llm_response.split())},
@@ -433,31 +966,27 @@ class EnhancedAgent:
         
         try:
             json_content = self._extract_json_from_response(llm_response)
-            parsed = json.loads(json_content)
+            parsed = orjson.loads(json_content)
             parsed["strategy"] = "transactional_only"
             parsed["knowledge_results"] = []
             parsed["context"] = ""
             return parsed
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return self._fallback_response(user_query)
     
-    async def _create_hybrid_plan(self, user_query: str, rag_response, session_state: Dict[str, Any], trace_id: str = None) -> Dict[str, Any]:
+    async def _create_hybrid_plan(self, user_query: str, rag_response, session_state: Dict[str, Any], trace_id: str = None,
+                                  pending_transactional_plan: Optional[asyncio.Task] = None) -> Dict[str, Any]:
         """Create plan for hybrid queries (knowledge + transactional)"""
         # Get transactional plan
-        transactional_plan = await self._create_transactional_plan(user_query, session_state, trace_id)
+        transactional_plan = await self._resolve_transactional_plan(
+            user_query, session_state, trace_id, pending_transactional_plan
+        )
         
         # Combine with knowledge results
         return {
             "strategy": "hybrid",
             "tool_calls": transactional_plan.get("tool_calls", []),
-            "knowledge_results": [
-                {
-                    "type": result.type,
-                    "content": result.content,
-                    "metadata": result.metadata,
-                    "score": result.score
-                } for result in rag_response.results
-            ],
+            "knowledge_results": self._serialize_results(rag_response),
             "response_strategy": "Combine knowledge base information with transactional tool results",
             "session_updates": transactional_plan.get("session_updates", {}),
             "context": rag_response.context
@@ -468,14 +997,7 @@ class EnhancedAgent:
         return {
             "strategy": "knowledge_with_context",
             "tool_calls": [],
-            "knowledge_results": [
-                {
-                    "type": result.type,
-                    "content": result.content,
-                    "metadata": result.metadata,
-                    "score": result.score
-                } for result in rag_response.results
-            ],
+            "knowledge_results": self._serialize_results(rag_response),
             "response_strategy": "Use knowledge base results with session context for personalized response",
             "session_updates": {},
             "context": rag_response.context,
@@ -484,76 +1006,128 @@ class EnhancedAgent:
     
     @langfuse_trace(name="tool_execution")
     async def execute_tools(self, tool_calls: List[Dict[str, Any]], session_id: str = "default", trace_id: str = None) -> List[Dict[str, Any]]:
-        """Execute transactional tools (same as Step 1)"""
-        results = []
-        
+        """Execute transactional tools concurrently, preserving tool call order in the results"""
         logger.info("Starting tool execution", tool_count=len(tool_calls), session_id=session_id)
         
-        for i, tool_call in enumerate(tool_calls, 1):
-            tool_name = tool_call["tool"]
-            parameters = tool_call["parameters"]
-            reasoning = tool_call.get("reasoning", "")
-            
-            tool_start_time = time.time()
-            
-            try:
-                if tool_name == "search_products":
-                    logger.info(f"🔍 Executing search_products with parameters: {parameters}")
-                    logger.info(f"🔍 MCP Tools API URL: {self.mcp_tools.api_url}")
-                    result = await self.mcp_tools.search_products(**parameters)
-                    logger.info(f"🔍 Search result: {result}")
-                    logger.info(f"🔍 Search result count: {result.get('count', 0)} products found")
-                elif tool_name == "get_products":
-                    result = await self.mcp_tools.get_products(**parameters)
-                elif tool_name == "get_customers":
-                    result = await self.mcp_tools.get_customers()
-                elif tool_name == "get_customer_orders":
-                    result = await self.mcp_tools.get_customer_orders(**parameters)
-                elif tool_name == "create_order":
-                    result = await self.mcp_tools.create_order(**parameters)
-                elif tool_name == "get_categories":
-                    result = await self.mcp_tools.get_categories()
-                else:
-                    result = {"success": False, "error": f"Unknown tool: {tool_name}"}
-                
-                tool_duration = (time.time() - tool_start_time) * 1000
-                result["tool"] = tool_name
-                results.append(result)
-                
-                # Log to LangFuse
-                langfuse_client.log_tool_execution(
-                    trace_id=trace_id,
-                    tool_name=tool_name,
-                    input_data=parameters,
-                    output_data=result,
-                    success=True,
-                    execution_time=tool_duration / 1000,
-                    metadata={"duration_ms": tool_duration, "reasoning": reasoning}
-                )
-                
-            except Exception as e:
-                tool_duration = (time.time() - tool_start_time) * 1000
-                error_result = {
-                    "success": False,
-                    "error": str(e),
-                    "tool": tool_name
-                }
-                results.append(error_result)
-                
-                # Log error to LangFuse
-                langfuse_client.log_tool_execution(
-                    trace_id=trace_id,
-                    tool_name=tool_name,
-                    input_data=parameters,
-                    output_data=error_result,
-                    success=False,
-                    execution_time=tool_duration / 1000,
-                    error_message=str(e),
-                    metadata={"duration_ms": tool_duration, "error": str(e)}
-                )
+        # Tool calls are independent unless the planner sets depends_on, so each
+        # stage's network I/O overlaps and stages run in dependency order
+        results = [None] * len(tool_calls)
+        for stage in self._stage_tool_calls(tool_calls):
+            stage_results = await asyncio.gather(
+                *(self._run_tool(tool_calls[i], trace_id) for i in stage),
+                return_exceptions=True
+            )
+            for i, result in zip(stage, stage_results):
+                if isinstance(result, Exception):
+                    result = {"success": False, "error": str(result), "tool": tool_calls[i].get("tool")}
+                elif isinstance(result, BaseException):
+                    raise result
+                results[i] = result
         
         return results
     
+    @staticmethod
+    def _stage_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[List[int]]:
+        """
+        Group tool call indices into stages that can run concurrently
+        
+        A call's depends_on may name earlier calls by index or by tool name; it
+        runs in a stage after all of them. Unresolvable cycles run together.
+        """
+        indices_by_tool = defaultdict(list)
+        for i, tool_call in enumerate(tool_calls):
+            indices_by_tool[tool_call.get("tool")].append(i)
+        
+        dependencies = []
+        for i, tool_call in enumerate(tool_calls):
+            refs = tool_call.get("depends_on")
+            if refs is None:
+                refs = []
+            elif not isinstance(refs, list):
+                refs = [refs]
+            deps = set()
+            for ref in refs:
+                if isinstance(ref, int):
+                    if 0 <= ref < len(tool_calls):
+                        deps.add(ref)
+                else:
+                    deps.update(indices_by_tool.get(ref, ()))
+            deps.discard(i)
+            dependencies.append(deps)
+        
+        stages = []
+        done = set()
+        pending = list(range(len(tool_calls)))
+        while pending:
+            ready = [i for i in pending if dependencies[i] <= done] or pending
+            stages.append(ready)
+            done.update(ready)
+            pending = [i for i in pending if i not in done]
+        
+        return stages
+    
+    async def _search_products_tool(self, **parameters) -> Dict[str, Any]:
+        """search_products with the diagnostic logging used when debugging product search"""
+        logger.info(f"🔍 Executing search_products with parameters: {parameters}")
+        logger.info(f"🔍 MCP Tools API URL: {self.mcp_tools.api_url}")
+        result = await self.mcp_tools.search_products(**parameters)
+        logger.info(f"🔍 Search result: {result}")
+        logger.info(f"🔍 Search result count: {result.get('count', 0)} products found")
+        return result
+    
+    async def _run_tool(self, tool_call: Dict[str, Any], trace_id: str = None) -> Dict[str, Any]:
+        """Execute a single transactional tool call and log it to LangFuse"""
+        tool_name = tool_call["tool"]
+        parameters = tool_call["parameters"]
+        reasoning = tool_call.get("reasoning", "")
+        
+        tool_start_time = time.time()
+        
+        try:
+            tool_fn = self._tool_dispatch.get(tool_name)
+            if tool_fn is not None:
+                result = await tool_fn(**parameters)
+            else:
+                result = {"success": False, "error": f"Unknown tool: {tool_name}"}
+            
+            tool_duration = (time.time() - tool_start_time) * 1000
+            result["tool"] = tool_name
+            
+            # Log to LangFuse
+            langfuse_client.log_tool_execution(
+                trace_id=trace_id,
+                tool_name=tool_name,
+                input_data=parameters,
+                output_data=result,
+                success=True,
+                execution_time=tool_duration / 1000,
+                metadata={"duration_ms": tool_duration, "reasoning": reasoning}
+            )
+            
+            return result
+            
+        except Exception as e:
+            tool_duration = (time.time() - tool_start_time) * 1000
+            error_result = {
+                "success": False,
+                "error": str(e),
+                "tool": tool_name
+            }
+            
+            # Log error to LangFuse
+            langfuse_client.log_tool_execution(
+                trace_id=trace_id,
+                tool_name=tool_name,
+                input_data=parameters,
+                output_data=error_result,
+                success=False,
+                execution_time=tool_duration / 1000,
+                error_message=str(e),
+                metadata={"duration_ms": tool_duration, "error": str(e)}
+            )
+            
+            return error_result
+    
     @observe(as_type="span")
     async def format_response(self, 
                             execution_plan: Dict[str, Any],
@@ -574,42 +1148,15 @@ class EnhancedAgent:
         Returns:
             Dict containing text response and UI components
         """
-        strategy = execution_plan.get("strategy", "transactional_only")
-        knowledge_results = execution_plan.get("knowledge_results", [])
-        knowledge_context = execution_plan.get("context", "")
-        
-        # Prepare context for response generation
-        context_parts = []
-        
-        # Add knowledge context if available
-        if knowledge_context:
-            context_parts.append(f"Knowledge Base Information:\n{knowledge_context}")
-        
-        # Add tool results if available
-        if tool_results:
-            tool_context = []
-            for result in tool_results:
-                if result.get("success"):
-                    data = result.get("data", [])
-                    tool_context.append(f"Tool: {result.get('tool')} returned {result.get('count', 0)} results")
-                    if isinstance(data, list) and data:
-                        # Add sample data for context
-                        tool_context.append(f"Sample data: {str(data[0])[:200]}...")
-            
-            if tool_context:
-                context_parts.append(f"Tool Results:\n{chr(10).join(tool_context)}")
-        
-        # Create response generation prompt
-        prompt = prompt_manager.get_response_generation_prompt(original_query, strategy, context_parts)
-        
         try:
-            # Generate text response
-            messages = [
-                SystemMessage(content=prompt_manager.get_response_system_prompt()),
-                HumanMessage(content=prompt)
-            ]
+            messages = self._build_response_messages(execution_plan, tool_results, original_query)
             
-            response = await self.response_llm.ainvoke(messages)
+            # Text and UI generation are independent once tool results are in,
+            # so both LLM roundtrips run concurrently
+            response, ui_spec = await asyncio.gather(
+                asyncio.wait_for(self.response_llm.ainvoke(messages), self.response_timeout),
+                self._generate_ui_for_response(original_query, execution_plan, tool_results, context)
+            )
             
             # Handle different response types  
             text_response = ""
@@ -620,18 +1167,6 @@ class EnhancedAgent:
             else:
                 text_response = str(response)
             
-            # Generate UI components if beneficial
-            ui_spec = {"ui_components": [], "layout_strategy": "text_only"}
-            
-            if self._should_generate_ui(original_query, execution_plan):
-                try:
-                    ui_spec = await self.generate_ui_response(
-                        original_query, execution_plan, tool_results, context
-                    )
-                except Exception as ui_error:
-                    logger.error(f"UI generation failed: {ui_error}")
-                    # Continue with text-only response
-            
             return {
                 "message": text_response,
                 "ui_components": ui_spec.get("ui_components", []),
@@ -650,19 +1185,119 @@ class EnhancedAgent:
                 "response_type": "error"
             }
     
+    async def format_response_stream(self,
+                                     execution_plan: Dict[str, Any],
+                                     tool_results: List[Dict[str, Any]],
+                                     original_query: str,
+                                     trace_id: str = None,
+                                     context: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of format_response
+        
+        Yields {"type": "text", "content": ...} events as the response LLM produces
+        tokens, then one {"type": "ui", ...} event carrying the UI components, which
+        are generated concurrently in a background task.
+        """
+        ui_task = asyncio.create_task(
+            self._generate_ui_for_response(original_query, execution_plan, tool_results, context)
+        )
+        try:
+            try:
+                messages = self._build_response_messages(execution_plan, tool_results, original_query)
+                async for chunk in self.response_llm.astream(messages):
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if text:
+                        yield {"type": "text", "content": text}
+            except Exception as e:
+                logger.error(f"Response streaming failed: {e}")
+                yield {
+                    "type": "error",
+                    "message": "I found some information but had trouble formatting the response. Please try again.",
+                    "layout_strategy": "error",
+                    "response_type": "error"
+                }
+                return
+            
+            ui_spec = await ui_task
+            yield {
+                "type": "ui",
+                "ui_components": ui_spec.get("ui_components", []),
+                "layout_strategy": ui_spec.get("layout_strategy", "text_only"),
+                "user_intent": ui_spec.get("user_intent", "unknown"),
+                "validation": ui_spec.get("validation", {}),
+                "response_type": "enhanced_with_ui"
+            }
+        finally:
+            # Errors and consumers that stop early (client disconnects) abandon the UI
+            if not ui_task.done():
+                ui_task.cancel()
+    
+    def _build_response_messages(self, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]],
+                                 original_query: str) -> List[Any]:
+        """Build the response-generation messages from knowledge context and tool results"""
+        strategy = execution_plan.get("strategy", "transactional_only")
+        knowledge_results = execution_plan.get("knowledge_results", [])
+        knowledge_context = execution_plan.get("context", "")
+        
+        # Prepare context for response generation
+        context_parts = []
+        
+        # Add knowledge context if available
+        if knowledge_context:
+            context_parts.append(f"Knowledge Base Information:\n{knowledge_context}")
+        
+        # Add tool results if available
+        if tool_results:
+            tool_context = []
+            for result in tool_results:
+                if result.get("success"):
+                    data = result.get("data", [])
+                    tool_context.append(f"Tool: {result.get('tool')} returned {result.get('count', 0)} results")
+                    if isinstance(data, list) and data:
+                        # Add sample data for context
+                        tool_context.append(f"Sample data: {_SAMPLE_REPR.repr(data[0])[:200]}...")
+            
+            if tool_context:
+                context_parts.append(f"Tool Results:\n{chr(10).join(tool_context)}")
+        
+        # Create response generation prompt
+        prompt = prompt_manager.get_response_generation_prompt(original_query, strategy, context_parts)
+        
+        return [
+            SystemMessage(content=prompt_manager.get_response_system_prompt()),
+            HumanMessage(content=prompt)
+        ]
+    
+    async def _generate_ui_for_response(self, original_query: str, execution_plan: Dict[str, Any],
+                                        tool_results: List[Dict[str, Any]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Generate UI components if beneficial, degrading to text-only on failure or timeout"""
+        ui_spec = {"ui_components": [], "layout_strategy": "text_only"}
+        
+        if self._should_generate_ui(original_query, execution_plan, tool_results):
+            try:
+                # Lowercased once here and shared by the UI generation steps downstream
+                ui_spec = await asyncio.wait_for(
+                    self.generate_ui_response(original_query, execution_plan, tool_results, context,
+                                              query_lower=original_query.lower()),
+                    self.ui_generation_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"UI generation timed out after {self.ui_generation_timeout}s")
+                # Continue with text-only response
+            except Exception as ui_error:
+                logger.error(f"UI generation failed: {ui_error}")
+                # Continue with text-only response
+        
+        return ui_spec
     
     def _extract_json_from_response(self, response: str) -> str:
         """Extract JSON content from LLM response"""
         response = response.strip()
         
-        if response.startswith('```json'):
-            end_index = response.find('```', 7)
-            if end_index != -1:
-                response = response[7:end_index].strip()
-        elif response.startswith('```'):
-            end_index = response.find('```', 3)
-            if end_index != -1:
-                response = response[3:end_index].strip()
+        # Strip a leading ```/```json fence, ignoring anything after its closing fence
+        fenced = _JSON_FENCE_RE.match(response)
+        if fenced:
+            return fenced.group(1)
         
         return response
     
@@ -709,24 +1344,33 @@ class EnhancedAgent:
             self.ui_generation_enabled = False
     
     async def _ensure_component_knowledge(self):
-        """Ensure agent has up-to-date component library knowledge"""
+        """
+        Ensure agent has up-to-date component library knowledge
+
+        A failed fetch leaves the library unloaded so the next query retries it;
+        UI generation stays enabled.
+        """
         try:
             if self.component_library is None:
                 library_result = await self.mcp_tools.get_component_library()
                 
                 if library_result.get("success"):
-                    self.component_library = library_result["data"]
+                    # Interned names so equal-type lookups can match on identity
+                    self.component_library = {
+                        sys.intern(name): info for name, info in library_result["data"].items()
+                    }
+                    self._component_types = frozenset(self.component_library)
+                    self._component_summary_cache = None
                     logger.info(f"Loaded {len(self.component_library)} components for UI generation")
                 else:
-                    logger.error(f"Failed to load component library: {library_result.get('error')}")
-                    self.ui_generation_enabled = False
+                    logger.warning(f"Failed to load component library, retrying on the next query: {library_result.get('error')}")
                     
         except Exception as e:
-            logger.error(f"Component library fetch failed: {e}")
-            self.ui_generation_enabled = False
+            logger.warning(f"Component library fetch failed, retrying on the next query: {e}")
     
     @langfuse_trace(name="ui_generation")
-    async def generate_ui_response(self, user_query: str, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def generate_ui_response(self, user_query: str, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]], context: Dict[str, Any] = None,
+                                   query_lower: Optional[str] = None) -> Dict[str, Any]:
         """Generate UI component specifications using intelligent component selection"""
         try:
             if not self.ui_generation_enabled:
@@ -738,7 +1382,7 @@ class EnhancedAgent:
             
             # Use intelligent component selection based on query and results  
             ui_components, layout_strategy, user_intent = await self._generate_intelligent_ui_components(
-                user_query, execution_plan, tool_results, context or {}
+                user_query, execution_plan, tool_results, context or {}, query_lower=query_lower
             )
             
             if not ui_components:
@@ -947,14 +1591,15 @@ class EnhancedAgent:
         return components
     
     @observe(as_type="span")
-    async def _generate_intelligent_ui_components(self, user_query: str, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]], context: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str, str]:
+    async def _generate_intelligent_ui_components(self, user_query: str, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]], context: Dict[str, Any],
+                                                  query_lower: Optional[str] = None) -> Tuple[List[Dict[str, Any]], str, str]:
         """Generate UI components using intelligent component selection"""
         try:
             # Extract data from tool results
             context_data = self._extract_context_data(tool_results, execution_plan)
             
             # Determine the primary workflow from query and results
-            workflow_type = self._determine_workflow_type(user_query, execution_plan, tool_results)
+            workflow_type = self._determine_workflow_type(user_query, execution_plan, tool_results, query_lower=query_lower)
             
             # Get suitable components based on workflow and data
             ui_components = []
@@ -1015,9 +1660,11 @@ class EnhancedAgent:
         
         return context_data
     
-    def _determine_workflow_type(self, user_query: str, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]]) -> str:
+    def _determine_workflow_type(self, user_query: str, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]],
+                                 query_lower: Optional[str] = None) -> str:
         """Determine the primary workflow type for UI generation"""
-        query_lower = user_query.lower()
+        if query_lower is None:
+            query_lower = user_query.lower()
         strategy = execution_plan.get("strategy", "")
         
         # Check for product-related queries
@@ -1188,7 +1835,7 @@ class EnhancedAgent:
             ui_spec = self._parse_ui_specification(response.content if hasattr(response, 'content') else str(response))
             
             # Validate specification
-            validated_spec = await self._validate_ui_specification(ui_spec)
+            validated_spec = self._validate_ui_specification(ui_spec)
             
             return validated_spec
             
@@ -1197,119 +1844,100 @@ class EnhancedAgent:
             return {"ui_components": [], "layout_strategy": "error", "error": str(e)}
     
     def _prepare_component_summary(self) -> str:
-        """Prepare component library summary for LLM"""
+        """Prepare component library summary for LLM, built once per loaded library"""
         if not self.component_library:
             return "No components available"
         
+        if self._component_summary_cache is not None:
+            return self._component_summary_cache
+        
         summary_parts = []
         
         # Group by category and limit to most useful components
-        categories = {}
+        categories = defaultdict(list)
         for comp_name, comp_info in self.component_library.items():
-            category = comp_info.get("category", "utility")
-            if category not in categories:
-                categories[category] = []
-            categories[category].append({
-                "name": comp_name,
-                "exports": comp_info.get("exports", [])[:3],  # Top 3 exports
-                "use_cases": comp_info.get("recommended_use_cases", [])[:2]  # Top 2 use cases
-            })
-        
-        # Priority order for categories
-        priority_categories = ["form", "layout", "data", "feedback", "navigation"]
+            categories[comp_info.get("category", "utility")].append(
+                (comp_name, comp_info.get("exports", [])[:3])  # Top 3 exports
+            )
         
-        for category in priority_categories:
+        for category in self.PRIORITY_COMPONENT_CATEGORIES:
             if category in categories:
                 summary_parts.append(f"\n{category.upper()}:")
-                for comp in categories[category][:3]:  # Top 3 per category
-                    summary_parts.append(f"  - {comp['name']}: {', '.join(comp['exports'])}")
+                for comp_name, exports in categories[category][:3]:  # Top 3 per category
+                    summary_parts.append(f"  - {comp_name}: {', '.join(exports)}")
         
-        return "\n".join(summary_parts)
+        self._component_summary_cache = "\n".join(summary_parts)
+        return self._component_summary_cache
     
     def _prepare_data_summary(self, execution_plan: Dict[str, Any], tool_results: List[Dict[str, Any]]) -> str:
         """Prepare data summary for UI generation"""
-        data_parts = []
-        
-        # Execution plan info
-        strategy = execution_plan.get("strategy", "unknown")
-        data_parts.append(f"Query Strategy: {strategy}")
+        # Reduce the inputs to a hashable signature: (tool, unit, size) per summarised result
+        tool_sig = []
+        for result in tool_results[:3]:  # Top 3 results
+            if result.get("success", False) and "data" in result:
+                data = result["data"]
+                if isinstance(data, list):
+                    tool_sig.append((result.get("tool", "unknown"), "items", len(data)))
+                elif isinstance(data, dict):
+                    tool_sig.append((result.get("tool", "unknown"), "fields", len(data)))
+                else:
+                    tool_sig.append((result.get("tool", "unknown"), None, 0))
         
-        # Tool results summary
-        if tool_results:
-            data_parts.append(f"\nData Available:")
-            for result in tool_results[:3]:  # Top 3 results
-                tool_name = result.get("tool", "unknown")
-                success = result.get("success", False)
-                if success and "data" in result:
-                    data = result["data"]
-                    if isinstance(data, list):
-                        data_parts.append(f"  - {tool_name}: {len(data)} items")
-                    elif isinstance(data, dict):
-                        data_parts.append(f"  - {tool_name}: {len(data)} fields")
-                    else:
-                        data_parts.append(f"  - {tool_name}: data available")
-        
-        return "\n".join(data_parts) if data_parts else "No specific data available"
+        return _data_summary(execution_plan.get("strategy", "unknown"), bool(tool_results), tuple(tool_sig))
     
     def _prepare_context_summary(self, context: Dict[str, Any]) -> str:
         """Prepare context information for LLM"""
-        context_parts = []
-        
-        if "customer_id" in context:
-            context_parts.append(f"Customer: {context['customer_id']}")
-        
-        if "session_id" in context:
-            context_parts.append(f"Session: {context['session_id']}")
+        customer = f"Customer: {context['customer_id']}" if "customer_id" in context else ""
+        session = f"Session: {context['session_id']}" if "session_id" in context else ""
         
-        return "\n".join(context_parts) if context_parts else "No additional context"
+        if customer and session:
+            return f"{customer}\n{session}"
+        return customer or session or "No additional context"
     
     def _parse_ui_specification(self, llm_response: str) -> Dict[str, Any]:
         """Parse LLM response into UI specification"""
-        try:
-            import re
-            
-            # Look for JSON block in response
-            json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-            else:
-                return json.loads(llm_response.strip())
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse UI specification: {e}")
-            return {
-                "ui_components": [],
-                "layout_strategy": "parse_error",
-                "error": "Failed to parse LLM response"
-            }
+        # The first complete JSON object in the response is scanned and decoded in one pass;
+        # the parser logs a malformed object itself
+        parser = IncrementalJsonParser()
+        ui_spec = parser.feed(llm_response)
+        if ui_spec is not None:
+            return ui_spec
+        
+        if not parser.done:
+            logger.error("Failed to parse UI specification: no complete JSON object in response")
+        return {
+            "ui_components": [],
+            "layout_strategy": "parse_error",
+            "error": "Failed to parse LLM response"
+        }
     
     @observe(as_type="span")
-    async def _validate_ui_specification(self, ui_spec: Dict[str, Any]) -> Dict[str, Any]:
+    def _validate_ui_specification(self, ui_spec: Dict[str, Any]) -> Dict[str, Any]:
         """Validate UI specification against component library"""
-        try:
-            validated_components = []
-            
-            for component_spec in ui_spec.get("ui_components", []):
-                component_type = component_spec.get("type")
-                
-                if component_type and component_type in self.component_library:
-                    validated_components.append(component_spec)
-                else:
-                    logger.warning(f"Unknown component type: {component_type}")
-            
-            ui_spec["ui_components"] = validated_components
-            ui_spec["validation"] = {
-                "total_requested": len(ui_spec.get("ui_components", [])),
-                "validated": len(validated_components),
-                "success": len(validated_components) > 0
-            }
-            
-            return ui_spec
-            
-        except Exception as e:
-            logger.error(f"UI specification validation failed: {e}")
-            return ui_spec
+        # Malformed LLM output is skipped where it can occur instead of guarding the whole pass
+        requested_components = ui_spec.get("ui_components")
+        if not isinstance(requested_components, list):
+            requested_components = []
+        validated_components = []
+        
+        for component_spec in requested_components:
+            if not isinstance(component_spec, dict):
+                continue
+            component_type = component_spec.get("type")
+            
+            if isinstance(component_type, str) and component_type in self._component_types:
+                validated_components.append(component_spec)
+            else:
+                logger.warning(f"Unknown component type: {component_type}")
+        
+        ui_spec["ui_components"] = validated_components
+        ui_spec["validation"] = {
+            "total_requested": len(requested_components),
+            "validated": len(validated_components),
+            "success": len(validated_components) > 0
+        }
+        
+        return ui_spec
     
     # ========================================
     # Intelligent Query Handlers
@@ -1588,29 +2216,38 @@ class EnhancedAgent:
         else:
             return "I've processed your request successfully!"
     
-    def _should_generate_ui(self, user_query: str, execution_plan: Dict[str, Any]) -> bool:
+    def _should_generate_ui(self, user_query: str, execution_plan: Dict[str, Any],
+                            tool_results: Optional[List[Dict[str, Any]]] = None) -> bool:
         """Determine if UI generation would be beneficial for this query"""
         if not self.ui_generation_enabled:
             return False
         
-        # UI-beneficial query patterns
-        ui_triggers = [
-            "show", "display", "list", "find", "search", "view", "see",
-            "products", "orders", "customers", "buy", "purchase", "cart"
-        ]
-        
-        query_lower = user_query.lower()
-        strategy = execution_plan.get("strategy", "")
+        # Tools that all came back empty leave nothing to render
+        if tool_results and all(
+            result.get("success") and result.get("count", 1 if result.get("data") else 0) == 0
+            for result in tool_results
+        ):
+            return False
         
-        # Check for UI trigger words
-        has_ui_trigger = any(trigger in query_lower for trigger in ui_triggers)
+        return self._ui_decision(user_query, execution_plan.get("strategy", ""))
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _ui_decision(user_query: str, strategy: str) -> bool:
+        """Pure (query, strategy) part of _should_generate_ui, memoised across requests"""
+        if strategy == "knowledge_only":
+            return False
         
         # Check for data-rich strategies
-        data_strategies = ["product_search", "order_inquiry", "customer_lookup", "transactional"]
-        has_data_strategy = any(strat in strategy for strat in data_strategies)
+        if EnhancedAgent._UI_DATA_STRATEGY_RE.search(strategy):
+            return True
         
-        return has_ui_trigger or has_data_strategy
+        # Check for UI trigger words
+        if EnhancedAgent._UI_TRIGGER_DB is not None:
+            return _literal_db_matches(EnhancedAgent._UI_TRIGGER_DB, user_query)
+        return EnhancedAgent._UI_TRIGGER_RE.search(user_query) is not None
     
     async def close(self):
         """Cleanup resources"""
-        await self.mcp_tools.close()
\ No newline at end of file
+        await self.mcp_tools.close()
+        await self.llm_config.aclose()
\ No newline at end of file
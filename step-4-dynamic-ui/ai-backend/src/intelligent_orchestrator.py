@@ -26,14 +26,20 @@ except ImportError:
             return func
         return decorator
 
+# Outermost {...} span in an LLM response, compiled once at import
+_JSON_BLOCK_RE = re.compile(r'\{[\s\S]*\}')
+
 class IntelligentOrchestrator:
     """
     LLM-driven tool orchestration system that lets the LLM decide 
     which tools to call and how to combine their results
     """
     
-    def __init__(self, llm, mcp_tools):
+    def __init__(self, llm, mcp_tools, planning_llm=None):
         self.llm = llm
+        # Tool planning may use a separately configured (response-cached) LLM;
+        # synthesis always goes to self.llm
+        self.planning_llm = planning_llm or llm
         self.mcp_tools = mcp_tools
         self.available_tools = self._get_tool_definitions()
         
@@ -305,11 +311,13 @@ Response: {{
 Now create an execution plan for the user query:"""
 
         try:
-            response = await self.llm.ainvoke(prompt)
+            # A request flagged bypass_llm_cache (debugging) always reaches the model
+            llm = self.llm if context.get("bypass_llm_cache") else self.planning_llm
+            response = await llm.ainvoke(prompt)
             content = response.content if hasattr(response, 'content') else str(response)
             
             # Extract JSON from response
-            json_match = re.search(r'\{[\s\S]*\}', content)
+            json_match = _JSON_BLOCK_RE.search(content)
             if json_match:
                 return json.loads(json_match.group())
             else:
@@ -423,7 +431,7 @@ Create the response:"""
             content = response.content if hasattr(response, 'content') else str(response)
             
             # Extract JSON from response
-            json_match = re.search(r'\{[\s\S]*\}', content)
+            json_match = _JSON_BLOCK_RE.search(content)
             if json_match:
                 return json.loads(json_match.group())
             else:
@@ -12,6 +12,9 @@ from enum import Enum
 from datetime import datetime
 from loguru import logger
 
+# Outermost {...} span in an LLM response, compiled once at import
+_JSON_BLOCK_RE = re.compile(r'\{[\s\S]*\}')
+
 class IntentType(Enum):
     """Types of user intents the system can handle"""
     # Product-related
@@ -195,7 +198,7 @@ Return as JSON with this structure:
             content = response.content if hasattr(response, 'content') else str(response)
             
             # Extract JSON from response
-            json_match = re.search(r'\{[\s\S]*\}', content)
+            json_match = _JSON_BLOCK_RE.search(content)
             if json_match:
                 return json.loads(json_match.group())
             else:
@@ -0,0 +1,36 @@
+"""
+Shared fixtures for the ai-backend unit tests.
+
+The agent is built without running EnhancedAgent.__init__, so no LLM,
+MCP, Qdrant or embedding model is contacted; each test sets only the
+state the code under test reads.
+"""
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+# Keep the on-disk LLM cache out of test runs
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.enhanced_agent import EnhancedAgent  # noqa: E402
+
+
+@pytest.fixture
+def agent():
+    agent = EnhancedAgent.__new__(EnhancedAgent)
+    agent.knowledge_confidence_threshold = 0.7
+    agent.mixed_query_threshold = 0.5
+    agent._build_routing_table()
+    agent._plan_cache = OrderedDict()
+    agent._plan_slabs = {}
+    agent._plan_cache_capacity = 512
+    agent._tau = 0.15
+    agent.sessions = OrderedDict()
+    agent.max_sessions = 100
+    agent.component_library = None
+    agent._component_types = frozenset()
+    return agent
@@ -0,0 +1,127 @@
+"""ContextResolver customer TTL cache and concurrent resolution"""
+import asyncio
+
+import pytest
+
+from src import context_resolver
+from src.context_resolver import ContextResolver
+
+
+class FakeMCPTools:
+    """In-memory MCP tools recording how often each lookup hits the backend"""
+    
+    def __init__(self, failing_products=()):
+        self.customer_calls = 0
+        self.order_calls = 0
+        self.failing_products = set(failing_products)
+    
+    async def get_customer_info(self, customer_id):
+        self.customer_calls += 1
+        await asyncio.sleep(0)
+        return {"success": True, "data": {"id": customer_id, "name": "Ada"}}
+    
+    async def get_customer_orders(self, customer_id, limit=1):
+        self.order_calls += 1
+        await asyncio.sleep(0)
+        return {"success": True, "data": [{"id": "ORD-1"}]}
+    
+    async def search_products(self, query):
+        if query in self.failing_products:
+            raise RuntimeError(f"search failed for {query}")
+        return {"success": True, "data": [{"id": f"p-{query}", "name": query}]}
+    
+    async def get_order(self, order_id):
+        return {"success": True, "data": {"id": order_id}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(context_resolver.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_customer_lookups_are_cached_until_ttl(clock):
+    tools = FakeMCPTools()
+    resolver = ContextResolver(tools)
+    session = {"customer_id": "c1"}
+    
+    first = asyncio.run(resolver._resolve_customer_context(session))
+    clock[0] += context_resolver.CUSTOMER_CACHE_TTL - 1
+    second = asyncio.run(resolver._resolve_customer_context(session))
+    
+    assert first == second == {"id": "c1", "name": "Ada"}
+    assert tools.customer_calls == 1
+    
+    clock[0] += 2
+    asyncio.run(resolver._resolve_customer_context(session))
+    assert tools.customer_calls == 2
+
+
+def test_concurrent_lookups_share_one_request(clock):
+    tools = FakeMCPTools()
+    resolver = ContextResolver(tools)
+    
+    async def resolve_many():
+        return await asyncio.gather(
+            *(resolver._resolve_customer_context({"customer_id": "c1"}) for _ in range(5))
+        )
+    
+    results = asyncio.run(resolve_many())
+    
+    assert all(result == {"id": "c1", "name": "Ada"} for result in results)
+    assert tools.customer_calls == 1
+    assert not resolver._customer_locks
+
+
+def test_order_lookups_are_shared_within_one_resolution():
+    tools = FakeMCPTools()
+    resolver = ContextResolver(tools)
+    order_lookups = {}
+    
+    async def resolve_both():
+        return await asyncio.gather(
+            resolver._resolve_temporal_reference("last", "order", {"id": "c1"}, order_lookups),
+            resolver._resolve_temporal_reference("last", "product", {"id": "c1"}, order_lookups),
+        )
+    
+    orders, _ = asyncio.run(resolve_both())
+    
+    assert orders["order_id"] == "ORD-1"
+    assert tools.order_calls == 1
+    
+    asyncio.run(resolver._resolve_temporal_reference("recent", "order", {"id": "c1"}))
+    assert tools.order_calls == 2
+
+
+def test_failed_entity_reference_does_not_drop_the_others():
+    resolver = ContextResolver(FakeMCPTools(failing_products={"ipad"}))
+    
+    resolved = asyncio.run(resolver._resolve_entity_references(["iphone", "ipad", "macbook"], "product"))
+    
+    assert [item["reference"] for item in resolved] == ["iphone", "macbook"]
+
+
+def test_failing_branch_marks_resolution_failed_but_keeps_other_results(monkeypatch):
+    resolver = ContextResolver(FakeMCPTools())
+    
+    async def broken_pronouns(self, intent, session, resolved):
+        raise RuntimeError("history unavailable")
+    
+    # ContextResolver uses __slots__, so the branch is replaced on the class
+    monkeypatch.setattr(ContextResolver, "_resolve_pronouns_into", broken_pronouns)
+    intent = {
+        "intent_type": "product_inquiry",
+        "required_context": ["customer_id"],
+        "temporal_reference": "none",
+        "target_entity": "product",
+        "entity_references": ["iphone"],
+        "action": "compare it",
+    }
+    
+    resolved = asyncio.run(resolver.resolve_references(intent, {"customer_id": "c1"}))
+    
+    assert resolved["resolution_status"] == "failed"
+    assert resolved["resolution_errors"] == ["history unavailable"]
+    assert resolved["resolved_entities"]["customer"] == {"id": "c1", "name": "Ada"}
+    assert resolved["resolved_entities"]["referenced_items"][0]["reference"] == "iphone"
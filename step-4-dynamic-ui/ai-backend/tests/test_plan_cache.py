@@ -0,0 +1,152 @@
+"""Approximate execution-plan cache in EnhancedAgent"""
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from rag_service import QueryType
+
+DIM = 64
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def at_distance(base, distance, seed=0):
+    """Unit vector whose cosine distance to unit vector base is distance"""
+    noise = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    orthogonal = unit(noise - noise.dot(base) * base)
+    similarity = 1.0 - distance
+    return unit(similarity * base + np.sqrt(1.0 - similarity ** 2) * orthogonal)
+
+
+BASE = unit(np.random.default_rng(42).standard_normal(DIM))
+PLAN = {"strategy": "transactional_only", "tool_calls": [{"tool": "search_products", "parameters": {"query": "iphone"}}]}
+KNOWLEDGE = {"query": "show iphones", "results": [{"source": "faq"}], "confidence": 0.4}
+
+
+def test_hit_within_tau_and_miss_beyond(agent):
+    agent._store_cached_plan("c1", "show iphones", BASE, PLAN, KNOWLEDGE)
+    
+    assert agent._lookup_cached_plan("c1", BASE) == (PLAN, KNOWLEDGE)
+    assert agent._lookup_cached_plan("c1", at_distance(BASE, 0.10)) == (PLAN, KNOWLEDGE)
+    assert agent._lookup_cached_plan("c1", at_distance(BASE, 0.25)) is None
+
+
+def test_plans_are_scoped_per_customer(agent):
+    agent._store_cached_plan("c1", "show iphones", BASE, PLAN)
+    
+    assert agent._lookup_cached_plan("c2", BASE) is None
+    assert agent._lookup_cached_plan(None, BASE) is None
+
+
+def test_anonymous_sessions_are_not_cached(agent):
+    agent._store_cached_plan(None, "show iphones", BASE, PLAN)
+    
+    assert not agent._plan_cache
+    assert agent._lookup_cached_plan(None, BASE) is None
+    
+    async def embed(user_query):
+        raise AssertionError("anonymous queries are not embedded")
+    
+    calls = _pipeline_agent(agent, embed)
+    for _ in range(2):
+        assert asyncio.run(agent.process_query("show iphones", {"session_id": "s1"})) == PLAN
+    assert calls["rag"] == 2
+
+
+def test_cached_plan_is_isolated_from_callers(agent):
+    plan = {"strategy": "transactional_only", "tool_calls": [{"tool": "get_products", "parameters": {}}]}
+    agent._store_cached_plan("c1", "products", BASE, plan)
+    plan["tool_calls"][0]["parameters"]["limit"] = 5
+    
+    hit, _ = agent._lookup_cached_plan("c1", BASE)
+    hit["tool_calls"].append({"tool": "get_categories"})
+    
+    again, _ = agent._lookup_cached_plan("c1", BASE)
+    assert again["tool_calls"] == [{"tool": "get_products", "parameters": {}}]
+
+
+def test_least_recently_used_plan_is_evicted(agent):
+    agent._plan_cache_capacity = 2
+    first, second, third = (at_distance(BASE, 0.9, seed) for seed in (1, 2, 3))
+    agent._store_cached_plan("c1", "first", first, {"n": 1})
+    agent._store_cached_plan("c2", "second", second, {"n": 2})
+    agent._store_cached_plan("c3", "third", third, {"n": 3})
+    
+    assert list(agent._plan_cache) == [("c2", "second"), ("c3", "third")]
+    assert "c1" not in agent._plan_slabs
+    assert agent._lookup_cached_plan("c1", first) is None
+    assert agent._lookup_cached_plan("c3", third) == ({"n": 3}, None)
+
+
+def _pipeline_agent(agent, embed, query_type=QueryType.TRANSACTIONAL):
+    """Wire the agent's collaborators to in-memory stand-ins for process_query"""
+    calls = {"rag": 0, "plan": 0}
+    
+    async def classify_query(user_query):
+        return query_type
+    
+    async def process_query(user_query, context):
+        calls["rag"] += 1
+        result = SimpleNamespace(type="faq", content="30 days", metadata={"source": "faq"}, score=0.9)
+        return SimpleNamespace(results=[result],
+                               confidence=0.9, query_type=query_type, context="faq answer")
+    
+    async def nothing():
+        return None
+    
+    async def transactional_plan(user_query, session_state, trace_id=None, bypass_llm_cache=False):
+        calls["plan"] += 1
+        return dict(PLAN)
+    
+    agent.rag_service = SimpleNamespace(classify_query=classify_query, process_query=process_query)
+    agent._embed_query = embed
+    agent._ensure_component_knowledge = nothing
+    agent._create_transactional_plan = transactional_plan
+    return calls
+
+
+def test_cache_hit_skips_pipeline_and_restores_knowledge_context(agent):
+    async def embed(user_query):
+        return BASE
+    
+    calls = _pipeline_agent(agent, embed)
+    context = {"session_id": "s1", "customerId": "c1"}
+    
+    first = asyncio.run(agent.process_query("show iphones", context))
+    agent.get_session_state("s1")["knowledge_context"] = None
+    second = asyncio.run(agent.process_query("show me iphones", context))
+    
+    assert first == second == PLAN
+    assert calls["rag"] == 1
+    knowledge_context = agent.get_session_state("s1")["knowledge_context"]
+    assert knowledge_context["results"] == [{"source": "faq"}]
+    assert knowledge_context["query"] == "show me iphones"
+
+
+def test_embedding_failure_only_bypasses_cache(agent):
+    async def embed(user_query):
+        raise RuntimeError("embedder down")
+    
+    calls = _pipeline_agent(agent, embed)
+    
+    plan = asyncio.run(agent.process_query("show iphones", {"session_id": "s1", "customerId": "c1"}))
+    
+    assert plan == PLAN
+    assert calls["rag"] == 1
+    assert not agent._plan_cache
+
+
+def test_knowledge_queries_do_not_plan_transactional_tools(agent):
+    async def embed(user_query):
+        raise RuntimeError("embedder down")
+    
+    calls = _pipeline_agent(agent, embed, query_type=QueryType.FAQ)
+    
+    plan = asyncio.run(agent.process_query("what is the return policy", {"session_id": "s1"}))
+    
+    assert plan["strategy"] == "knowledge_only"
+    assert calls["plan"] == 0
@@ -0,0 +1,35 @@
+"""Precomputed routing table against the routing rules it was built from"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from rag_service import QueryType
+
+# Both thresholds, values just either side of them, and the extremes
+CONFIDENCES = (0.0, 0.3, 0.5, 0.5000001, 0.6, 0.7, 0.7000001, 0.9, 1.0)
+
+
+@pytest.mark.parametrize("query_type", list(QueryType))
+@pytest.mark.parametrize("has_results", (False, True))
+@pytest.mark.parametrize("confidence", CONFIDENCES)
+def test_routing_table_matches_rules(agent, query_type, has_results, confidence):
+    rag_response = SimpleNamespace(
+        results=[object()] if has_results else [],
+        confidence=confidence,
+        query_type=query_type
+    )
+    decision = asyncio.run(agent.determine_routing_strategy("query", rag_response, {}))
+    
+    assert (decision["strategy"], decision["reasoning"]) == agent._route(query_type, has_results, confidence)
+
+
+def test_rebuilding_picks_up_new_thresholds(agent):
+    agent.knowledge_confidence_threshold = 0.9
+    agent._build_routing_table()
+    rag_response = SimpleNamespace(results=[object()], confidence=0.8, query_type=QueryType.FAQ)
+    
+    decision = asyncio.run(agent.determine_routing_strategy("query", rag_response, {}))
+    
+    assert decision["strategy"] != "knowledge_only"
+    assert decision["strategy"] == agent._route(QueryType.FAQ, True, 0.8)[0]
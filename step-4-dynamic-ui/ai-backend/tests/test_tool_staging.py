@@ -0,0 +1,45 @@
+"""depends_on ordering in EnhancedAgent._stage_tool_calls"""
+from src.enhanced_agent import EnhancedAgent
+
+stage = EnhancedAgent._stage_tool_calls
+
+
+def test_independent_calls_share_one_stage():
+    calls = [{"tool": "get_products"}, {"tool": "get_categories"}, {"tool": "get_customers"}]
+    assert stage(calls) == [[0, 1, 2]]
+
+
+def test_depends_on_index_zero_is_honoured():
+    calls = [{"tool": "get_customer_info"}, {"tool": "get_customer_orders", "depends_on": 0}]
+    assert stage(calls) == [[0], [1]]
+
+
+def test_depends_on_tool_name_and_list():
+    calls = [
+        {"tool": "search_products"},
+        {"tool": "get_customer_info"},
+        {"tool": "create_order", "depends_on": ["search_products", 1]},
+        {"tool": "get_order", "depends_on": "create_order"},
+    ]
+    assert stage(calls) == [[0, 1], [2], [3]]
+
+
+def test_unknown_and_self_references_are_ignored():
+    calls = [{"tool": "a", "depends_on": [0, 7, "missing"]}, {"tool": "b"}]
+    assert stage(calls) == [[0, 1]]
+
+
+def test_cycles_run_together_after_ready_calls():
+    calls = [
+        {"tool": "a"},
+        {"tool": "b", "depends_on": [0, 2]},
+        {"tool": "c", "depends_on": 1},
+    ]
+    assert stage(calls) == [[0], [1, 2]]
+
+
+def test_every_call_is_staged_exactly_once():
+    calls = [{"tool": f"t{i}", "depends_on": i - 1 if i else None} for i in range(5)]
+    stages = stage(calls)
+    assert sorted(i for s in stages for i in s) == list(range(5))
+    assert stages == [[0], [1], [2], [3], [4]]
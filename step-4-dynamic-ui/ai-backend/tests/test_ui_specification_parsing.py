@@ -0,0 +1,58 @@
+"""IncrementalJsonParser and _parse_ui_specification"""
+import random
+
+import orjson
+
+from src.enhanced_agent import IncrementalJsonParser
+
+NESTED = '{"ui_components": [{"type": "Card", "props": {"title": "a}\\"{b"}}], "layout_strategy": "grid"}'
+
+
+def test_fenced_response_returns_first_object():
+    text = f'Sure, here it is:\n```json\n{NESTED}\n```\nand also {{"other": 1}}'
+    parser = IncrementalJsonParser()
+    assert parser.feed(text) == orjson.loads(NESTED)
+    assert parser.done
+    assert parser.object_text() == NESTED
+
+
+def test_braces_and_escaped_quotes_inside_strings_are_ignored():
+    spec = IncrementalJsonParser().feed(NESTED)
+    assert spec["ui_components"][0]["props"]["title"] == 'a}"{b'
+
+
+def test_chunked_feed_matches_single_feed():
+    text = f"prefix {NESTED} suffix"
+    expected = orjson.loads(NESTED)
+    closing = text.index(NESTED) + len(NESTED)
+    rng = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, 20)))
+        parser = IncrementalJsonParser()
+        for start, end in zip([0] + cuts, cuts + [len(text)]):
+            result = parser.feed(text[start:end])
+            # None until the chunk holding the closing brace, the object from then on
+            assert result == (expected if end >= closing else None)
+
+
+def test_incomplete_object_is_not_done():
+    parser = IncrementalJsonParser()
+    assert parser.feed('{"ui_components": [') is None
+    assert not parser.done
+    assert parser.object_text() is None
+
+
+def test_malformed_object_is_done_without_result():
+    parser = IncrementalJsonParser()
+    assert parser.feed('{"ui_components": [1,,]}') is None
+    assert parser.done
+    assert parser.result is None
+
+
+def test_parse_ui_specification(agent):
+    assert agent._parse_ui_specification(f"```json\n{NESTED}\n```") == orjson.loads(NESTED)
+    
+    for bad in ("no json here", '{"ui_components": [1,,]}', '{"open": '):
+        spec = agent._parse_ui_specification(bad)
+        assert spec["layout_strategy"] == "parse_error"
+        assert spec["ui_components"] == []
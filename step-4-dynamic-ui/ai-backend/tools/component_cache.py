@@ -8,6 +8,10 @@ import asyncio
 from pathlib import Path
 from typing import Dict, Any, Optional
 import logging
+# File I/O goes through aiofiles' thread pool rather than io_uring: there is no
+# maintained io_uring binding among the dependencies, and the snapshot is only
+# read on a memory-cache miss, so moving it off the event loop is what matters
+import aiofiles
 
 logger = logging.getLogger(__name__)
 
@@ -89,22 +93,22 @@ class ComponentCache:
                 return None
             
             # Check if component files changed
-            with open(self.version_file, 'r') as f:
-                cached_hash = f.read().strip()
+            async with aiofiles.open(self.version_file, 'r') as f:
+                cached_hash = (await f.read()).strip()
             
             if current_hash != cached_hash:
                 logger.info("Component files changed, file cache invalidated")
                 return None
             
             # Load cached data
-            with open(self.cache_file, 'r') as f:
-                cached_data = json.load(f)
+            async with aiofiles.open(self.cache_file, 'r') as f:
+                cached_data = json.loads(await f.read())
             
             # Load metadata if available
             metadata = {}
             if self.metadata_file.exists():
-                with open(self.metadata_file, 'r') as f:
-                    metadata = json.load(f)
+                async with aiofiles.open(self.metadata_file, 'r') as f:
+                    metadata = json.loads(await f.read())
             
             logger.info(f"Loaded {len(cached_data)} components from file cache")
             return {
@@ -143,17 +147,17 @@ class ComponentCache:
         """Save components to file cache"""
         try:
             # Save component data
-            with open(self.cache_file, 'w') as f:
-                json.dump(components, f, indent=2, default=str)
+            async with aiofiles.open(self.cache_file, 'w') as f:
+                await f.write(json.dumps(components, indent=2, default=str))
             
             # Save version hash
-            with open(self.version_file, 'w') as f:
-                f.write(current_hash)
+            async with aiofiles.open(self.version_file, 'w') as f:
+                await f.write(current_hash)
             
             # Save metadata
             if metadata:
-                with open(self.metadata_file, 'w') as f:
-                    json.dump(metadata, f, indent=2, default=str)
+                async with aiofiles.open(self.metadata_file, 'w') as f:
+                    await f.write(json.dumps(metadata, indent=2, default=str))
             
         except Exception as e:
             logger.error(f"File cache save failed: {e}")
@@ -25,7 +25,11 @@ class MCPTools:
     
     def __init__(self, traditional_api_url: str = "http://localhost:4000", client_components_path: str = None):
         self.api_url = traditional_api_url
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared pooled client so concurrent tool calls reuse keep-alive connections
+        self.client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
         
         # Initialize component scanning system
         if client_components_path is None:
@@ -650,12 +654,15 @@ class MCPTools:
             )
             
             if cached_result:
+                cached_result["version"] = current_hash
                 return cached_result
             
             # Cache miss - scan components
             scan_result = await self.component_scanner.scan_all_components()
             
             if scan_result.get("success"):
+                scan_result["version"] = current_hash
+                
                 # Save to cache for future use
                 await self.component_cache.save_to_cache(
                     scan_result["data"], 
@@ -673,6 +680,10 @@ class MCPTools:
             logger.error(f"Component library scan failed: {e}")
             return {"success": False, "error": str(e)}
     
+    def get_component_library_version(self) -> str:
+        """Current component directory hash, the version get_component_library reports"""
+        return self.component_scanner.get_directory_hash()
+    
     @observe(as_type="span")
     async def get_component_schema(self, component_name: str) -> Dict[str, Any]:
         """MCP Tool: Get detailed schema for specific component"""
@@ -926,6 +937,14 @@ class MCPTools:
         
         return recommendations
     
+    async def ping(self) -> Dict[str, Any]:
+        """Lightweight reachability probe for the traditional API"""
+        response = await self.client.get(f"{self.api_url}/api/categories", timeout=2.0)
+        return {
+            "status": "healthy" if response.status_code == 200 else "unhealthy",
+            "api_url": self.api_url
+        }
+    
     async def close(self):
         """Close HTTP client and cleanup"""
         await self.client.aclose()
@@ -2,6 +2,6 @@
 RAG Service Package
 Provides semantic search and knowledge retrieval capabilities
 """
-from .rag_service import RAGService, QueryType, SearchResult, RAGResponse
+from .rag_service import RAGService, QueryType, SearchResult, RAGResponse, get_embedder
 
-__all__ = ['RAGService', 'QueryType', 'SearchResult', 'RAGResponse']
\ No newline at end of file
+__all__ = ['RAGService', 'QueryType', 'SearchResult', 'RAGResponse', 'get_embedder']
\ No newline at end of file
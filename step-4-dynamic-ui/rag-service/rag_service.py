@@ -4,6 +4,7 @@ RAG Service for semantic search and knowledge retrieval from Qdrant
 import os
 import sys
 import asyncio
+import functools
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
@@ -41,7 +42,7 @@ class QueryType(Enum):
     TRANSACTIONAL = "transactional"
     MIXED = "mixed"
 
-@dataclass
+@dataclass(slots=True)
 class SearchResult:
     """Result from vector search"""
     id: str
@@ -60,6 +61,23 @@ class RAGResponse:
     confidence: float
     sources: List[str]
 
+@functools.lru_cache(maxsize=None)
+def get_embedder(model_name: str = "all-MiniLM-L6-v2") -> SentenceTransformer:
+    """
+    Get the shared embedding model, loading it on first use
+    
+    Every RAGService instance (and any other consumer, e.g. a semantic cache)
+    resolves the same model name to the same instance.
+    
+    Args:
+        model_name: SentenceTransformer model name
+        
+    Returns:
+        Shared SentenceTransformer instance
+    """
+    logger.info(f"Loading embedding model: {model_name}")
+    return SentenceTransformer(model_name)
+
 class RAGService:
     """RAG service for semantic search and knowledge retrieval"""
     
@@ -82,9 +100,7 @@ class RAGService:
         # Initialize Qdrant client
         self.client = QdrantClient(host=qdrant_host, port=qdrant_port)
         
-        # Initialize embedding model
-        logger.info(f"Loading embedding model: {embedding_model}")
-        self.embedding_model = SentenceTransformer(embedding_model)
+        # Embedding model is loaded lazily and shared via get_embedder()
         
         # Collection names
         self.faq_collection = "ecommerce_faq"
@@ -112,6 +128,45 @@ class RAGService:
             "promotion", "eligibility", "qualification", "threshold", "limit"
         }
     
+    @property
+    def embedding_model(self) -> SentenceTransformer:
+        """Shared embedding model, loaded on first use"""
+        return get_embedder(self.embedding_model_name)
+    
+    @property
+    def embedder(self) -> SentenceTransformer:
+        """Alias for the shared embedding model"""
+        return self.embedding_model
+    
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a single text as a unit-length vector
+        
+        Args:
+            text: Text to embed
+        
+        Returns:
+            L2-normalized float32 embedding, so dot products are cosine similarities
+        """
+        return self.embedding_model.encode(
+            text, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+    
+    def embed_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Embed many texts in one batched model call
+        
+        Args:
+            texts: Texts to embed
+            batch_size: Encoder batch size
+        
+        Returns:
+            (len(texts), dim) matrix of L2-normalized float32 embeddings
+        """
+        return self.embedding_model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+    
     @observe(as_type="span")
     async def classify_query(self, query: str) -> QueryType:
         """